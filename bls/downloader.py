@@ -1,15 +1,20 @@
 from TAI.source import BLS
 from TAI.data import DataMaster
 from datetime import datetime
-import json
+import os
+import sys
+import polars as pl
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.chart_json import chart_frame, concat_json_arrays, encode_chart_entries
+from common.downsample import SHORT_WINDOW, downsample_entries
+from common.metrics import incr, start_run, timer
+from common.rate_limiter import get_rate_limiter
+from common.s3_upload import JSON_CONTENT_ENCODING, get_uploader
 
-print('PROCESS STARTS AT : {}'.format(datetime.now()))
 
 dm = DataMaster()
-
-# BLS instance with a user-defined lookback period
-bls = BLS(lookback_years=30)  # User can set any number of years
+uploader = get_uploader()
 
 # Series information for various datasets
 series_info = {
@@ -21,84 +26,178 @@ series_info = {
 
 # Directory where data files will be stored
 data_dir = "bls_data"
-
-# Modify these methods in the BLS class to save data in the new structure
-bls.fetch_and_save_bls_data(series_info, file_format="json",
-                            start_year=bls.start_year, end_year=bls.end_year, mode='overwrite')
-
-# bls.update_historical_data(series_info, file_format="json")
+# Merged observations of each series; the per-run downloads in data_dir only cover the years fetched
+state_dir = os.path.join(data_dir, 'state')
+BACKFILL_YEARS = 30  # Years fetched for a series with no local state
+INCREMENTAL_YEARS = 2  # Current and previous year, which covers BLS revisions of recent months
+YEARS_PER_REQUEST = 20  # BLS API v2 returns at most 20 years of a series per query
+DAILY_REQUEST_CAP = 500  # BLS API v2 requests per key per day
 
 # Data processing and saving to S3
 data_files = ['unemployment_rate', 'nonfarm_payroll',
               'us_avg_weekly_hours', 'us_job_opening']
 bucket_name = 'jtrade1-dir'
 s3_folder = 'api/bls'
-
-
-def filter_yearly_data(data):
-    current_year = datetime.now().year
-    # We want the current year plus 4 previous years
-    five_years_ago = current_year - 4
-
-    yearly_data = []
-    for item in data:
-        chart_data = item['chartData']
-        yearly_points = {}
-        for point in chart_data:
-            # Extract year from date string and convert to int
-            year = int(point['date'][:4])
-            if year >= five_years_ago:
-                yearly_points[year] = point
-
-        item['chartData'] = list(yearly_points.values())
-        yearly_data.append(item)
-    return yearly_data
-
-
-agg_data = []
-agg_data_short = []
-for idx, data_file in enumerate(data_files, start=1):
-    output_data = []
-    # print('dddddddd', idx, data_file)
-    local_path = f'{data_dir}/{data_file}.json'
-    data = dm.load_local(data_dir, f'{data_file}.json', load_all=False)
-
-    # Restructure the data
-    chart_data = [{"date": entry["date"], "value": entry["value"]}
-                  for entry in data]
-
-    output_entry = {
+# Reduced views published next to each full file as {s3_folder}_{name}/{data_file}_{name}.json: name -> (resolution, years)
+DERIVED_WINDOWS = {'short': SHORT_WINDOW}
+
+
+def state_path(data_file):
+    return os.path.join(state_dir, f'{data_file}.parquet')
+
+
+def load_state(data_file):
+    """Stored observations of a series (all fetched years, merged), or None before its first backfill."""
+    path = state_path(data_file)
+    return pl.read_parquet(path) if os.path.exists(path) else None
+
+
+def merge_observations(stored, fetched):
+    """Upsert fetched observations by date; a fetched month replaces the stored one, so revisions win."""
+    if stored is None:
+        return fetched.sort('date')
+    kept = stored.join(fetched.select('date'), on='date', how='anti')
+    return pl.concat([kept, fetched], how='diagonal_relaxed').sort('date')
+
+
+def year_chunks(start_year, end_year, overlap_first=False):
+    """(request start, keep from, end) of each request covering start_year..end_year.
+
+    Every request spans at most YEARS_PER_REQUEST years; after the first (and the first too with overlap_first),
+    each one re-requests the year before its own, so values computed from the prior month (month-over-month
+    changes) are complete at the boundary.
+    """
+    chunks, first = [], start_year
+    while first <= end_year:
+        request_start = first - 1 if overlap_first or first != start_year else first
+        last = min(end_year, request_start + YEARS_PER_REQUEST - 1)
+        chunks.append((request_start, first, last))
+        first = last + 1
+    return chunks
+
+
+@timer('bls.fetch')
+def fetch_series():
+    """Update every series in the local state: a full backfill for series without state, otherwise only the
+    current and previous year (merged over the stored months)."""
+    # BLS instance with a user-defined lookback period
+    bls = BLS(lookback_years=BACKFILL_YEARS)  # User can set any number of years
+    limiter = get_rate_limiter('bls')
+
+    missing = {name: info for name, info in series_info.items() if not os.path.exists(state_path(name))}
+    current = {name: info for name, info in series_info.items() if name not in missing}
+    runs = []
+    if missing:
+        runs.append(('backfill', missing, bls.start_year))
+    if current:
+        runs.append(('incremental', current, bls.end_year - INCREMENTAL_YEARS + 1))
+
+    def chunks(mode, start_year):
+        # Stored series keep their months before start_year, so their first fetched month needs its prior month
+        # too; otherwise it would replace a complete stored value with one computed without December
+        return year_chunks(start_year, bls.end_year, overlap_first=mode == 'incremental')
+
+    # One series and one chunk of years per call, so each limiter token stands for a single BLS API request
+    planned = sum(len(subset) * len(chunks(mode, start_year)) for mode, subset, start_year in runs)
+    if planned > DAILY_REQUEST_CAP:
+        raise RuntimeError(f"{planned} BLS requests planned, over the daily cap of {DAILY_REQUEST_CAP}")
+
+    os.makedirs(state_dir, exist_ok=True)
+    for mode, subset, start_year in runs:
+        print(f"BLS {mode} {start_year}-{bls.end_year}: {', '.join(subset)}")
+        for data_file, info in subset.items():
+            frames = []
+            for request_start, keep_from, last in chunks(mode, start_year):
+                # Goes through the shared BLS quota; rate-limit errors pause and retry this request
+                with timer(f'bls.fetch_{mode}'):
+                    limiter.call(bls.fetch_and_save_bls_data, {data_file: info}, file_format="json",
+                                 start_year=request_start, end_year=last, mode='overwrite')
+                chunk = pl.DataFrame(dm.load_local(data_dir, f'{data_file}.json', load_all=False),
+                                     infer_schema_length=None)
+                year = pl.col('date').cast(pl.Utf8).str.slice(0, 4).cast(pl.Int32, strict=False)
+                frames.append(chunk.filter(year >= keep_from))
+            fetched = pl.concat(frames, how='diagonal_relaxed')
+            incr('rows', fetched.height, stage='fetched')
+            with timer('bls.merge'):
+                merged = merge_observations(load_state(data_file), fetched)
+                merged.write_parquet(state_path(data_file) + '.tmp')
+                os.replace(state_path(data_file) + '.tmp', state_path(data_file))
+
+
+def save_local_json(filename, body):
+    with open(os.path.join(data_dir, filename), 'wb') as f:
+        f.write(body)
+
+
+@timer('bls.publish')
+def publish_series(data_file):
+    """Restructure one downloaded series into chart JSON, save it (full and short) and upload both."""
+    idx = data_files.index(data_file) + 1
+    raw = load_state(data_file)
+
+    # Restructure the data in bulk
+    chart_data = chart_frame(raw["date"], raw["value"])
+
+    output_data = [{
         "id": str(idx),
         "name": series_info[data_file]['name'],
         "category": "bls",
         "chartType": "line",
         "description": f"{series_info[data_file]['name']} data from BLS.",
         "chartData": chart_data
-    }
-
-    output_data.append(output_entry)
-    agg_data.append(output_entry)
-    agg_data_short.append(filter_yearly_data([output_entry])[0])
+    }]
 
     # Save full version
-    dm.save_local(output_data, data_dir, f'{data_file}.json', use_polars=False)
-    dm.save_s3(output_data, bucket_name, s3_folder,
-               f'{data_file}.json', use_polars=False, delete_local=True)
-
-    # Save short version
-    short_data = filter_yearly_data(output_data)
-    dm.save_local(short_data, data_dir,
-                  f'{data_file}_short.json', use_polars=False)
-    dm.save_s3(short_data, bucket_name, f'{s3_folder}_short',
-               f'{data_file}_short.json', use_polars=False, delete_local=True)
-
-# # Save the restructured data to S3
-# restructured_data = json.dumps(output_data, indent=2)
-dm.save_s3(agg_data, bucket_name, s3_folder,
-           'bls_data.json', use_polars=False, delete_local=False)
-
-# Save the short dataset to S3
-dm.save_s3(agg_data_short, bucket_name, 'api/bls_short',
-           'bls_data_short.json', use_polars=False, delete_local=False)
-
-print('PROCESS ENDS AT : {}'.format(datetime.now()))
+    body = encode_chart_entries(output_data)
+    incr('serialized_bytes', len(body))
+    save_local_json(f'{data_file}.json', body)
+    uploader.submit_bytes(bucket_name, f'{s3_folder}/{data_file}.json', body,
+                          content_encoding=JSON_CONTENT_ENCODING)
+
+    # Save the derived versions (e.g. {data_file}_short.json) in the same pass
+    for name, derived in downsample_entries(output_data, DERIVED_WINDOWS).items():
+        derived_body = encode_chart_entries(derived)
+        incr('serialized_bytes', len(derived_body))
+        save_local_json(f'{data_file}_{name}.json', derived_body)
+        uploader.submit_bytes(bucket_name, f'{s3_folder}_{name}/{data_file}_{name}.json', derived_body,
+                              content_encoding=JSON_CONTENT_ENCODING)
+    wait_for_uploads()
+
+
+@timer('bls.aggregate')
+def aggregate():
+    """Combine the per-series files written by publish_series into bls_data.json and its derived versions."""
+    for suffix in [''] + [f'_{name}' for name in DERIVED_WINDOWS]:
+        bodies = []
+        for data_file in data_files:
+            with open(os.path.join(data_dir, f'{data_file}{suffix}.json'), 'rb') as f:
+                bodies.append(f.read())
+        # The per-series files are already encoded; join them without parsing
+        uploader.submit_bytes(bucket_name, f'{s3_folder}{suffix}/bls_data{suffix}.json', concat_json_arrays(bodies),
+                              content_encoding=JSON_CONTENT_ENCODING)
+    wait_for_uploads()
+
+
+def wait_for_uploads():
+    """Wait for the queued uploads (they run concurrently in the background); raises if any failed."""
+    with timer('bls.upload_wait'):
+        failed_uploads = uploader.wait()
+    if failed_uploads:
+        raise RuntimeError(f"{failed_uploads} BLS uploads failed")
+
+
+def main():
+    print('PROCESS STARTS AT : {}'.format(datetime.now()))
+    metrics = start_run('bls')
+    try:
+        fetch_series()
+        for data_file in data_files:
+            publish_series(data_file)
+        aggregate()
+    finally:
+        print(f"Run report: {metrics.write_report()}")
+    print('PROCESS ENDS AT : {}'.format(datetime.now()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3.10
+"""
+Microbenchmark chart JSON serialization per point: the old per-observation loop (pd.isna + strftime +
+one dict per point, then json.dumps) vs. chart_frame + encode_chart_entries, on daily series with gaps.
+Usage: python bench_chart_json.py --points 1000 10000 100000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.chart_json import chart_frame, encode_chart_entries
+
+META = {"id": "1", "name": "sp500", "category": "fred", "chartType": "line", "description": "S&P 500 Index."}
+
+
+def make_series(points: int) -> pd.Series:
+    """Daily series like FRED's sp500, with about 4% missing observations (holidays) as NaN."""
+    rng = np.random.default_rng(0)
+    values = rng.uniform(1000, 5000, points)
+    values[rng.random(points) < 0.04] = np.nan
+    return pd.Series(values, index=pd.date_range(end='2024-06-28', periods=points, freq='D'))
+
+
+def serialize_loop(data: pd.Series) -> bytes:
+    json_data = []
+    for date, value in data.items():
+        if pd.isna(value):
+            value = None
+        json_data.append({"date": date.strftime('%Y-%m-%d'), "value": value})
+    return json.dumps([dict(META, chartData=json_data)]).encode('utf-8')
+
+
+def serialize_vectorized(data: pd.Series) -> bytes:
+    return encode_chart_entries([dict(META, chartData=chart_frame(data.index, data.values))])
+
+
+def best_of(func, data, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--points', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'points':>8} {'loop (ns/pt)':>13} {'vectorized (ns/pt)':>19} {'speedup':>8}")
+    for points in args.points:
+        data = make_series(points)
+        # Same document either way (modulo whitespace inside chartData)
+        assert json.loads(serialize_loop(data)) == json.loads(serialize_vectorized(data))
+        loop = best_of(serialize_loop, data, args.repeat) / points * 1e9
+        vectorized = best_of(serialize_vectorized, data, args.repeat) / points * 1e9
+        print(f"{points:>8} {loop:>13.0f} {vectorized:>19.0f} {loop / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3.10
+"""
+Benchmark S3 upload throughput: one PUT at a time vs. the pooled S3Uploader at several concurrency levels,
+plus one large multipart object. Runs against a local moto server by default, or any S3 stand-in (e.g. MinIO)
+via --endpoint-url.
+Usage: python bench_s3_upload.py --objects 400 --size-kb 300 --concurrency 1 4 16 32
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.s3_upload import S3Uploader
+
+BUCKET = 'bench-bucket'
+
+
+def start_moto_server() -> str:
+    from moto.server import ThreadedMotoServer
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # Per-request access log
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    return f'http://{host}:{port}'
+
+
+def make_uploader(rtt_ms: float, **kwargs) -> S3Uploader:
+    uploader = S3Uploader(**kwargs)
+    if rtt_ms:
+        # A local stand-in answers in microseconds; add a simulated network round trip to every request
+        uploader.client.meta.events.register('before-send.s3.*', lambda **_: time.sleep(rtt_ms / 1000))
+    return uploader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--objects', type=int, default=400)
+    parser.add_argument('--size-kb', type=int, default=300, help='Size of each object (a ticker JSON is a few hundred KB)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--multipart-mb', type=int, default=64, help='Size of the single large object')
+    parser.add_argument('--endpoint-url', help='Existing S3 stand-in; a moto server is started if omitted')
+    parser.add_argument('--rtt-ms', type=float, default=20, help='Simulated round trip added to each request (0 to disable)')
+    args = parser.parse_args()
+
+    # Dummy credentials for the local stand-in
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    endpoint_url = args.endpoint_url or start_moto_server()
+
+    body = os.urandom(args.size_kb * 1024)
+    total_mb = args.objects * len(body) / 1024 / 1024
+    S3Uploader(endpoint_url=endpoint_url).client.create_bucket(Bucket=BUCKET)
+
+    print(f"{args.objects} objects x {args.size_kb} KB = {total_mb:.0f} MB against {endpoint_url}, RTT {args.rtt_ms:g} ms")
+    print(f"{'mode':>18} {'wall (s)':>9} {'objects/s':>10} {'MB/s':>8}")
+
+    serial = make_uploader(args.rtt_ms, max_concurrency=1, endpoint_url=endpoint_url)
+    start = time.perf_counter()
+    for i in range(args.objects):
+        serial.client.put_object(Bucket=BUCKET, Key=f'serial/{i}.json', Body=body)
+    elapsed = time.perf_counter() - start
+    print(f"{'serial put_object':>18} {elapsed:>9.2f} {args.objects / elapsed:>10.1f} {total_mb / elapsed:>8.1f}")
+
+    for concurrency in args.concurrency:
+        uploader = make_uploader(args.rtt_ms, max_concurrency=concurrency, endpoint_url=endpoint_url)
+        start = time.perf_counter()
+        for i in range(args.objects):
+            uploader.submit_bytes(BUCKET, f'pooled-{concurrency}/{i}.json', body)
+        failed = uploader.wait()
+        elapsed = time.perf_counter() - start
+        label = f'pooled x{concurrency}'
+        print(f"{label:>18} {elapsed:>9.2f} {args.objects / elapsed:>10.1f} {total_mb / elapsed:>8.1f}"
+              + (f"  ({failed} failed)" if failed else ''))
+
+    large = os.urandom(args.multipart_mb * 1024 * 1024)
+    for label, threshold in (('single PUT', len(large) + 1), ('multipart', 8 * 1024 * 1024)):
+        uploader = make_uploader(args.rtt_ms, multipart_threshold=threshold, endpoint_url=endpoint_url)
+        start = time.perf_counter()
+        uploader.put_bytes(BUCKET, f'large/{label}.parquet', large, content_type='application/octet-stream')
+        elapsed = time.perf_counter() - start
+        print(f"{label + f' {args.multipart_mb}MB':>18} {elapsed:>9.2f} {'':>10} {args.multipart_mb / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Vectorized serialization of chart JSON ([{id, name, ..., chartData: [{date, value}, ...]}]) used by the
+FRED and BLS pipelines. A series is held as a two-column Polars frame (date string, value) and encoded in
+bulk: dates are formatted in one call, NaN becomes null and chartData is written by Polars straight into
+the output bytes, with no per-point Python dicts.
+"""
+
+import json
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def chart_frame(dates, values) -> pl.DataFrame:
+    """Build a chart series from date-likes (datetimes or strings) and values; NaN values become null."""
+    if isinstance(dates, pl.Series):
+        date_series = dates
+    else:
+        index = pd.Index(dates)
+        if isinstance(index, pd.DatetimeIndex):
+            if index.tz is not None:
+                index = index.tz_localize(None)
+            date_series = pl.Series('date', index.values)
+        else:
+            date_series = pl.Series('date', index.astype(str).to_numpy())
+    if date_series.dtype.is_temporal():
+        date_series = date_series.dt.strftime(DATE_FORMAT)
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.to_numpy()
+    value_series = pl.Series('value', values if isinstance(values, (np.ndarray, pl.Series)) else list(values),
+                             strict=False)
+    if value_series.dtype.is_float():
+        value_series = value_series.fill_nan(None)
+    return pl.DataFrame([date_series.alias('date'), value_series.alias('value')])
+
+
+def encode_chart_entries(entries: List[Dict[str, Any]]) -> bytes:
+    """Encode chart entries whose 'chartData' is a chart_frame; other fields are serialized with json."""
+    parts = []
+    for entry in entries:
+        meta = {key: value for key, value in entry.items() if key != 'chartData'}
+        chart_data = entry.get('chartData')
+        if chart_data is None:
+            parts.append(json.dumps(meta, default=str))
+            continue
+        points = chart_data.write_json() if not chart_data.is_empty() else '[]'
+        head = json.dumps(meta, default=str)
+        # Splice the Polars-encoded points in as the last key, where the per-point dicts used to go
+        parts.append(f'{head[:-1]}, "chartData": {points}}}' if meta else f'{{"chartData": {points}}}')
+    return ('[' + ', '.join(parts) + ']').encode('utf-8')
+
+
+def concat_json_arrays(bodies: List[bytes]) -> bytes:
+    """Join already-encoded JSON arrays into one array without parsing them."""
+    items = [body.strip()[1:-1].strip() for body in bodies]
+    return b'[' + b', '.join(item for item in items if item) + b']'
@@ -0,0 +1,54 @@
+"""
+Derive reduced views of a chart series (see chart_json.chart_frame) in one vectorized pass.
+A window is (resolution, last N years): resolution keeps the last point of each year/month/week
+(None keeps every point) and N limits it to the current year plus the N - 1 before it (None keeps all years).
+Periods are found on the date-sorted series (a sorted copy is made only if the input is not sorted);
+the full frame is only read, never modified.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import polars as pl
+
+Window = Tuple[Optional[str], Optional[int]]
+
+SHORT_WINDOW: Window = ('yearly', 5)  # Last point of each of the last five years, the '_short' files
+
+_date = pl.col('date')
+PERIOD_KEYS = {
+    'yearly': _date.str.slice(0, 4),
+    'monthly': _date.str.slice(0, 7),
+    'weekly': _date.str.to_date('%Y-%m-%d', strict=False).dt.truncate('1w'),
+}
+
+
+def downsample(chart_data: pl.DataFrame, windows: Dict[str, Window],
+               as_of_year: Optional[int] = None) -> Dict[str, pl.DataFrame]:
+    """Return {window name: reduced frame} for every window, computing all selections in one select."""
+    as_of_year = as_of_year or datetime.now().year
+    if not chart_data['date'].is_sorted():
+        chart_data = chart_data.sort('date')
+    year = _date.str.slice(0, 4).cast(pl.Int32, strict=False)
+    masks = []
+    for name, (resolution, years) in windows.items():
+        mask = pl.lit(True)
+        if resolution is not None:
+            key = PERIOD_KEYS[resolution]
+            # Sorted input: a point is the last of its period when the next point starts another one
+            mask = mask & key.ne_missing(key.shift(-1))
+        if years is not None:
+            mask = mask & (year >= as_of_year - (years - 1))
+        masks.append(mask.alias(name))
+    selected = chart_data.select(masks)
+    return {name: chart_data.filter(selected[name]) for name in windows}
+
+
+def downsample_entries(entries: List[Dict[str, Any]], windows: Dict[str, Window],
+                       as_of_year: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Apply downsample to the chartData of chart entries; returns new entries per window, inputs untouched."""
+    derived = {name: [] for name in windows}
+    for entry in entries:
+        for name, chart_data in downsample(entry['chartData'], windows, as_of_year).items():
+            derived[name].append(dict(entry, chartData=chart_data))
+    return derived
@@ -0,0 +1,146 @@
+"""
+Per-run instrumentation shared by the pipelines: stage timers (context manager or decorator), counters
+(requests, retries, rows, bytes, ...) and peak memory. Everything is recorded on the current run of the process
+(start_run), and write_report leaves a machine-readable report of it in REPORT_DIR: a timestamped JSON file per
+run, and <run>.prom in the Prometheus text format, overwritten by the next run (for node_exporter's textfile
+collector).
+"""
+
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_DIR = os.environ.get('RUN_REPORT_DIR', os.path.join(REPO_ROOT, 'run_reports'))
+PROMETHEUS_PREFIX = 'data_pipeline'
+
+
+def get_peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def get_current_rss_mb() -> float:
+    """Current resident set size of this process in MB (from /proc on Linux; the peak elsewhere)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return get_peak_rss_mb()
+
+
+def _label_text(labels: Dict[str, str]) -> str:
+    return ','.join(f'{key}="{value}"' for key, value in labels.items())
+
+
+class RunMetrics:
+    """Stage timings and counters of one run; safe to update from worker threads."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, list] = {}  # stage -> [calls, total seconds, max seconds]
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}  # (name, labels) -> value
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            calls, total, longest = self.stages.get(stage, (0, 0.0, 0.0))
+            self.stages[stage] = [calls + 1, total + seconds, max(longest, seconds)]
+
+    def incr(self, counter: str, value: float = 1, **labels):
+        key = (counter, tuple(sorted((name, str(label)) for name, label in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def report(self) -> dict:
+        with self._lock:
+            stages = {stage: {'calls': calls, 'total_seconds': round(total, 6), 'max_seconds': round(longest, 6)}
+                      for stage, (calls, total, longest) in sorted(self.stages.items())}
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        return {
+            'run': self.name,
+            'started_at': self.started_at.isoformat(),
+            'duration_seconds': round(time.perf_counter() - self._start, 6),
+            'peak_rss_mb': round(get_peak_rss_mb(), 1),
+            'stages': stages,
+            'counters': counters,
+        }
+
+    def prometheus_text(self, report: Optional[dict] = None) -> str:
+        report = report or self.report()
+        run = {'run': self.name}
+        lines = []
+
+        def add(metric: str, kind: str, samples):
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{metric} {kind}')
+            lines.extend(f'{PROMETHEUS_PREFIX}_{metric}{{{_label_text(labels)}}} {value}' for labels, value in samples)
+
+        add('run_timestamp_seconds', 'gauge', [(run, int(self.started_at.timestamp()))])
+        add('run_duration_seconds', 'gauge', [(run, report['duration_seconds'])])
+        add('peak_rss_bytes', 'gauge', [(run, int(report['peak_rss_mb'] * 1024 * 1024))])
+        stages = report['stages'].items()
+        add('stage_calls_total', 'counter', [(dict(run, stage=stage), s['calls']) for stage, s in stages])
+        add('stage_seconds_total', 'counter', [(dict(run, stage=stage), s['total_seconds']) for stage, s in stages])
+        add('stage_max_seconds', 'gauge', [(dict(run, stage=stage), s['max_seconds']) for stage, s in stages])
+        by_name: Dict[str, list] = {}
+        for counter in report['counters']:
+            by_name.setdefault(re.sub(r'\W', '_', counter['name']), []).append(
+                (dict(run, **counter['labels']), counter['value']))
+        for name, samples in by_name.items():
+            add(f'{name}_total', 'counter', samples)
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, report_dir: str = REPORT_DIR) -> str:
+        """Write <run>-<timestamp>.json and <run>.prom to report_dir; returns the JSON path."""
+        report = self.report()
+        os.makedirs(report_dir, exist_ok=True)
+        json_path = os.path.join(report_dir, f"{self.name}-{self.started_at.strftime('%Y%m%dT%H%M%S')}.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        # Written aside and renamed, so the collector never reads a partial file
+        prom_path = os.path.join(report_dir, f'{self.name}.prom')
+        with open(prom_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text(report))
+        os.replace(prom_path + '.tmp', prom_path)
+        return json_path
+
+
+_current = RunMetrics('default')
+
+
+def start_run(name: str) -> RunMetrics:
+    """Begin a new run; metrics recorded from now on belong to it."""
+    global _current
+    _current = RunMetrics(name)
+    return _current
+
+
+def get_metrics() -> RunMetrics:
+    return _current
+
+
+def incr(counter: str, value: float = 1, **labels):
+    """Add value to a counter of the current run, e.g. incr('rows', len(df), source='fred')."""
+    _current.incr(counter, value, **labels)
+
+
+@contextmanager
+def timer(stage: str):
+    """Time a block, or a function when used as @timer(stage), into the current run's stage totals."""
+    metrics = _current
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(stage, time.perf_counter() - start)
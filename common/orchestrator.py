@@ -0,0 +1,152 @@
+"""
+Run downloader jobs as a DAG: jobs whose dependencies are done run concurrently, each in a worker process.
+A job is a function in one of the pipeline scripts; the worker switches to the script's directory first,
+since every pipeline reads and writes paths relative to it. Dependents of a failed job are skipped.
+"""
+
+import importlib.util
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence
+
+from common.metrics import start_run
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Job:
+    """One DAG node: call func(*args) from the script at path (relative to the repo root) after deps succeed."""
+
+    def __init__(self, name: str, path: str, func: str, args: Sequence = (), deps: Sequence[str] = ()):
+        self.name = name
+        self.path = path
+        self.func = func
+        self.args = tuple(args)
+        self.deps = list(deps)
+
+    def __repr__(self):
+        return f"Job({self.name!r}, {self.path}:{self.func}, deps={self.deps})"
+
+
+class JobResult:
+    def __init__(self, name: str, status: str, started: float = 0.0, seconds: float = 0.0, error: str = ''):
+        self.name = name
+        self.status = status  # 'ok', 'failed' or 'skipped'
+        self.started = started  # Seconds after the run started
+        self.seconds = seconds
+        self.error = error
+
+
+def load_script(path: str):
+    """Import a pipeline script by path, under a unique module name (several scripts are called downloader.py)."""
+    full_path = os.path.join(REPO_ROOT, path)
+    module_name = os.path.splitext(path)[0].replace(os.sep, '.').replace('/', '.')
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    script_dir = os.path.dirname(full_path)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)  # Sibling imports such as bar_store
+    spec = importlib.util.spec_from_file_location(module_name, full_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_job(name: str, path: str, func: str, args: tuple):
+    """Worker entry point: run one job from its script's directory and return (start time, seconds).
+
+    The job's metrics are written as its own run report (named after the job), whether it succeeds or not.
+    """
+    start = time.time()
+    metrics = start_run(name)
+    try:
+        os.chdir(os.path.dirname(os.path.join(REPO_ROOT, path)))
+        getattr(load_script(path), func)(*args)
+    finally:
+        metrics.write_report()
+    return start, time.time() - start
+
+
+def validate(jobs: List[Job]):
+    names = [job.name for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Duplicate job names")
+    for job in jobs:
+        missing = [dep for dep in job.deps if dep not in names]
+        if missing:
+            raise ValueError(f"{job.name} depends on unknown jobs {missing}")
+    # Kahn's algorithm: every job must become ready eventually, otherwise there is a cycle
+    remaining = {job.name: set(job.deps) for job in jobs}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle among {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+def run_dag(jobs: List[Job], max_workers: Optional[int] = None) -> Dict[str, JobResult]:
+    """Run jobs as soon as their dependencies succeed, up to max_workers at a time, and return their results."""
+    validate(jobs)
+    by_name = {job.name: job for job in jobs}
+    results: Dict[str, JobResult] = {}
+    running: Dict[Future, Job] = {}
+    workers: Dict[Future, ProcessPoolExecutor] = {}
+    max_workers = max_workers or len(jobs)
+    run_start = time.time()
+    # Spawned workers do not inherit the parent's threads, locks or open connections. Each job gets a worker
+    # process of its own (max_tasks_per_child needs Python 3.11), so its run report's peak RSS is its own
+    context = multiprocessing.get_context('spawn')
+    try:
+        while len(results) < len(jobs):
+            for job in jobs:
+                if job.name in results or job in running.values():
+                    continue
+                dep_status = [results[dep].status if dep in results else None for dep in job.deps]
+                if any(status in ('failed', 'skipped') for status in dep_status):
+                    results[job.name] = JobResult(job.name, 'skipped', error='dependency failed')
+                    logger.warning(f"Skipping {job.name}: a dependency failed")
+                elif all(status == 'ok' for status in dep_status) and len(running) < max_workers:
+                    logger.info(f"Starting {job.name}")
+                    worker = ProcessPoolExecutor(max_workers=1, mp_context=context)
+                    future = worker.submit(run_job, job.name, job.path, job.func, job.args)
+                    running[future], workers[future] = job, worker
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                workers.pop(future).shutdown()
+                try:
+                    started, seconds = future.result()
+                    results[job.name] = JobResult(job.name, 'ok', started - run_start, seconds)
+                    logger.info(f"Finished {job.name} in {seconds:.1f}s")
+                except Exception as e:
+                    error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+                    results[job.name] = JobResult(job.name, 'failed', error=error)
+                    logger.error(f"{job.name} failed: {error}")
+    finally:
+        for worker in workers.values():
+            worker.shutdown()
+    return {job.name: results[job.name] for job in by_name.values()}
+
+
+def format_report(results: Dict[str, JobResult], wall_seconds: float) -> str:
+    """Per-job start offset and wall time, plus the total against the sum of all jobs."""
+    lines = [f"{'job':<28} {'status':<8} {'start (s)':>9} {'wall (s)':>9}"]
+    for result in results.values():
+        lines.append(f"{result.name:<28} {result.status:<8} {result.started:>9.1f} {result.seconds:>9.1f}"
+                     + (f"  {result.error}" if result.error else ''))
+    serial = sum(result.seconds for result in results.values())
+    lines.append(f"Total wall time {wall_seconds:.1f}s (jobs add up to {serial:.1f}s)")
+    return '\n'.join(lines)
@@ -0,0 +1,126 @@
+"""
+Process-wide token-bucket rate limiter with per-provider quotas.
+All callers of a provider share one bucket, so requests are spaced at the sustained rate and a
+rate-limit response (honoring Retry-After) pauses every caller at once instead of each retrying on its own.
+"""
+
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from common.metrics import incr
+
+logger = logging.getLogger(__name__)
+
+# provider: (requests per minute, burst size)
+PROVIDER_QUOTAS: Dict[str, Tuple[float, int]] = {
+    'alpaca': (200, 10),    # Alpaca market data: 200 requests/minute (bar calls are sized to one page each)
+    'fred': (120, 5),       # FRED API: 120 requests/minute
+    'bls': (50, 5),         # BLS API v2: keep well under 50 requests / 10 seconds and the daily cap
+    'treasury': (60, 5),    # Treasury.gov has no published quota; stay polite
+}
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    """True if the exception looks like an HTTP 429 / rate-limit rejection."""
+    response = getattr(e, 'response', None)
+    if getattr(e, 'status_code', None) == 429 or getattr(response, 'status_code', None) == 429:
+        return True
+    message = str(e).lower()
+    return 'rate limit' in message or 'too many requests' in message
+
+
+def retry_after_seconds(e: Exception) -> Optional[float]:
+    """Seconds to wait from the Retry-After header of the exception's response, if present."""
+    headers = getattr(getattr(e, 'response', None), 'headers', None) or {}
+    value = headers.get('Retry-After') if hasattr(headers, 'get') else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket; tokens refill at requests_per_minute / 60 per second up to burst."""
+
+    def __init__(self, name: str, requests_per_minute: float, burst: int = 1, max_retries: int = 5):
+        self.name = name
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst
+        self.max_retries = max_retries
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            # Nothing refills while the provider has asked us to back off
+            effective_now = max(now, self._blocked_until)
+            self._tokens = min(self.capacity, self._tokens + (effective_now - self._updated) * self.rate)
+            self._updated = effective_now
+            # Tokens may go negative: callers queue up behind each other at the sustained rate
+            self._tokens -= 1
+            deficit_wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return (effective_now - now) + deficit_wait
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds`, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._blocked_until:
+                self._blocked_until = until
+                self._tokens = min(self._tokens, 0.0)
+                self._updated = until
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call func under the limiter, retrying rate-limit errors after a shared pause."""
+        retry_delay = 1  # Start with 1 second when the provider gives no Retry-After
+        for attempt in range(self.max_retries):
+            self.acquire()
+            incr('requests', provider=self.name)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                incr('retries', provider=self.name)
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = retry_delay + random.uniform(0, retry_delay / 2)  # Jitter
+                    retry_delay *= 2  # Exponential backoff
+                logger.warning(f"{self.name} rate limited, pausing all requests for {delay:.1f}s")
+                self.pause(delay)
+        raise RuntimeError(f"Max retries reached for {self.name}")
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> TokenBucket:
+    """Return the shared limiter for a provider listed in PROVIDER_QUOTAS."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            requests_per_minute, burst = PROVIDER_QUOTAS[provider]
+            _limiters[provider] = TokenBucket(provider, requests_per_minute, burst)
+        return _limiters[provider]
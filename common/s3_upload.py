@@ -0,0 +1,191 @@
+"""
+Upload in-memory payloads and local files to S3 with no local file round trip.
+One process-wide uploader shares a pooled boto3 client, bounds the number of PUTs in flight,
+switches to multipart for large objects and retries failed uploads with jittered backoff.
+"""
+
+import gzip
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from common.metrics import incr
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_UPLOADS = 16  # PUTs in flight (and HTTP connections in the client pool)
+MULTIPART_THRESHOLD = 16 * 1024 * 1024  # Objects above this size are uploaded in parts
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+MAX_RETRIES = 5
+JSON_CONTENT_ENCODING = None  # 'gzip' or 'br' to store API JSON pre-compressed (served with Content-Encoding)
+
+
+def encode_body(body: bytes, content_encoding: Optional[str]) -> bytes:
+    """Compress a payload for the given Content-Encoding (None leaves it as is)."""
+    if content_encoding is None:
+        return body
+    if content_encoding == 'gzip':
+        # mtime=0 keeps the output (and its ETag) stable for identical content
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    if content_encoding == 'br':
+        import brotli
+        return brotli.compress(body, quality=9)
+    raise ValueError(f"Unsupported content encoding: {content_encoding}")
+
+
+class S3Uploader:
+    """Bounded, pooled, retrying S3 uploader shared by all pipelines."""
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_UPLOADS, multipart_threshold: int = MULTIPART_THRESHOLD,
+                 multipart_chunksize: int = MULTIPART_CHUNKSIZE, max_retries: int = MAX_RETRIES,
+                 endpoint_url: Optional[str] = None):
+        self.max_concurrency = max_concurrency
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        self.max_retries = max_retries
+        self.endpoint_url = endpoint_url
+        self._client = None
+        self._transfer_config = None
+        self._client_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Callers block in submit() once this many uploads are queued or running
+        self._slots = threading.BoundedSemaphore(max_concurrency * 2)
+        self._pending: List[Future] = []
+        self._pending_lock = threading.Lock()
+
+    def _init_client(self):
+        """Create the boto3 client (thread-safe, one connection pool) and transfer config on first use."""
+        with self._client_lock:
+            if self._client is None:
+                import boto3
+                from boto3.s3.transfer import TransferConfig
+                from botocore.config import Config
+                self._client = boto3.client(
+                    's3', endpoint_url=self.endpoint_url,
+                    config=Config(max_pool_connections=self.max_concurrency, retries={'mode': 'standard'}),
+                )
+                self._transfer_config = TransferConfig(
+                    multipart_threshold=self.multipart_threshold,
+                    multipart_chunksize=self.multipart_chunksize,
+                    max_concurrency=4,
+                )
+
+    @property
+    def client(self):
+        self._init_client()
+        return self._client
+
+    @property
+    def transfer_config(self):
+        """Multipart settings used by upload_file/upload_fileobj."""
+        self._init_client()
+        return self._transfer_config
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._client_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='s3-upload')
+            return self._executor
+
+    def _with_retries(self, description: str, func, *args, **kwargs):
+        delay = 0.5
+        for attempt in range(1, self.max_retries + 1):
+            incr('requests', provider='s3')
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                incr('retries', provider='s3')
+                sleep_for = random.uniform(0, delay)  # Full jitter
+                logger.warning(f"Upload of {description} failed ({e}), retry {attempt} in {sleep_for:.2f}s")
+                time.sleep(sleep_for)
+                delay *= 2
+
+    def put_bytes(self, bucket: str, key: str, body: bytes, content_type: str = 'application/json',
+                  content_encoding: Optional[str] = None, **extra_args):
+        """Upload an already-serialized object synchronously, as one PUT or multipart if large.
+
+        With content_encoding, the body is compressed here (on the worker thread) and stored with that Content-Encoding.
+        """
+        if content_encoding:
+            body = encode_body(body, content_encoding)
+            extra_args['ContentEncoding'] = content_encoding
+        incr('upload_bytes', len(body))
+        if len(body) > self.multipart_threshold:
+            args = dict(extra_args, ContentType=content_type)
+            # A fresh buffer per attempt, since a failed attempt may have consumed it
+            self._with_retries(key, lambda: self.client.upload_fileobj(
+                io.BytesIO(body), bucket, key, ExtraArgs=args, Config=self.transfer_config))
+        else:
+            self._with_retries(key, self.client.put_object, Bucket=bucket, Key=key, Body=body,
+                               ContentType=content_type, **extra_args)
+
+    def put_file(self, local_path: str, bucket: str, key: str, content_type: Optional[str] = None, **extra_args):
+        """Upload a local file synchronously; large files go multipart with parallel parts."""
+        if content_type:
+            extra_args['ContentType'] = content_type
+        incr('upload_bytes', os.path.getsize(local_path))
+        self._with_retries(key, self.client.upload_file, local_path, bucket, key,
+                           ExtraArgs=extra_args or None, Config=self.transfer_config)
+
+    def _submit(self, func, *args, **kwargs) -> Future:
+        self._slots.acquire()
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._pending_lock:
+            # Keep only uploads still running or failed, for wait() to report
+            self._pending = [f for f in self._pending if not f.done() or f.exception() is not None]
+            self._pending.append(future)
+        return future
+
+    def submit_bytes(self, bucket: str, key: str, body: bytes, content_type: str = 'application/json',
+                     content_encoding: Optional[str] = None, **extra_args) -> Future:
+        """Queue put_bytes on the pool; blocks while too many uploads are outstanding."""
+        return self._submit(self.put_bytes, bucket, key, body, content_type, content_encoding, **extra_args)
+
+    def submit_json(self, bucket: str, key: str, data: Any, content_encoding: Optional[str] = JSON_CONTENT_ENCODING,
+                    **extra_args) -> Future:
+        """Serialize a JSON-compatible object once and queue its upload (pre-compressed per JSON_CONTENT_ENCODING)."""
+        body = json.dumps(data, default=str).encode('utf-8')
+        return self.submit_bytes(bucket, key, body, content_encoding=content_encoding, **extra_args)
+
+    def submit_file(self, local_path: str, bucket: str, key: str, **extra_args) -> Future:
+        return self._submit(self.put_file, local_path, bucket, key, **extra_args)
+
+    def wait(self) -> int:
+        """Wait for every queued upload, log failures and return how many failed since the last wait."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        failed = 0
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                logger.error(f"S3 upload failed: {e}")
+        return failed
+
+
+_uploader: Optional[S3Uploader] = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader() -> S3Uploader:
+    """Return the process-wide uploader."""
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            _uploader = S3Uploader()
+        return _uploader
@@ -0,0 +1,60 @@
+"""
+Load per-ticker Arrow IPC files published by daily_bar_downloader (api/stock_daily_bar_arrow/{symbol}.arrow).
+Files are uncompressed, so they are memory-mapped and read zero-copy instead of parsed.
+"""
+
+import os
+
+import polars as pl
+import pyarrow as pa
+
+ARROW_DIR = 'data/stock_daily_bar_arrow'
+S3_BUCKET = 'jtrade1-dir'
+S3_ARROW_PREFIX = 'api/stock_daily_bar_arrow'
+
+
+def symbol_path(symbol: str, arrow_dir: str = ARROW_DIR) -> str:
+    return os.path.join(arrow_dir, f'{symbol}.arrow')
+
+
+def read_symbol_table(symbol: str, arrow_dir: str = ARROW_DIR) -> pa.Table:
+    """Memory-map one symbol's bars as a pyarrow Table; columns reference the mapped file without copying."""
+    with pa.memory_map(symbol_path(symbol, arrow_dir)) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def read_symbol(symbol: str, arrow_dir: str = ARROW_DIR) -> pl.DataFrame:
+    """Memory-map one symbol's bars as a Polars DataFrame (built zero-copy from the mapped Arrow buffers)."""
+    return pl.from_arrow(read_symbol_table(symbol, arrow_dir))
+
+
+def download_symbol(symbol: str, arrow_dir: str = ARROW_DIR, bucket: str = S3_BUCKET,
+                    prefix: str = S3_ARROW_PREFIX) -> str:
+    """Fetch a symbol's Arrow file from S3 into arrow_dir and return its local path.
+
+    A local copy is revalidated with a conditional GET on the ETag it was downloaded with, and is only
+    replaced when S3 holds a newer export.
+    """
+    import boto3
+    from botocore.exceptions import ClientError
+    path = symbol_path(symbol, arrow_dir)
+    etag_path = path + '.etag'
+    request = {'Bucket': bucket, 'Key': f'{prefix}/{symbol}.arrow'}
+    if os.path.exists(path) and os.path.exists(etag_path):
+        with open(etag_path, 'r', encoding='utf-8') as f:
+            request['IfNoneMatch'] = f.read().strip()
+    try:
+        response = boto3.client('s3').get_object(**request)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+            return path
+        raise
+    os.makedirs(arrow_dir, exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        for chunk in response['Body'].iter_chunks(1 << 20):
+            f.write(chunk)
+    # Replaced rather than rewritten in place, so tables still mapped from the old file stay valid
+    os.replace(path + '.tmp', path)
+    with open(etag_path, 'w', encoding='utf-8') as f:
+        f.write(response['ETag'])
+    return path
@@ -0,0 +1,144 @@
+"""
+Append-only Parquet store for daily bars, Hive-partitioned by year: <root>/year=YYYY/*.parquet.
+Each update writes a small delta file into the partitions it touches; compaction periodically folds
+a partition's deltas into its base file, so write cost scales with new data rather than total history.
+"""
+
+import glob
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+import polars as pl
+
+BASE_FILE = 'base.parquet'  # Compacted file of a partition; sorts before delta-* files
+KEY_COLUMNS = ['symbol', 'timestamp']
+ROW_GROUP_SIZE = 16_384  # Small row groups over symbol-sorted files let symbol filters skip most of a file
+
+
+def sort_and_dedupe(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """Sort by (symbol, timestamp) and keep the first row per key; the stable sort lets input order break ties."""
+    return lf.sort(KEY_COLUMNS, maintain_order=True).filter(pl.struct(KEY_COLUMNS).is_first_distinct())
+
+
+class BarStore:
+    """Year-partitioned Parquet store keyed by (symbol, timestamp)."""
+
+    def __init__(self, root: str, compression: str = 'snappy', row_group_size: int = ROW_GROUP_SIZE):
+        self.root = root
+        self.compression = compression
+        self.row_group_size = row_group_size
+
+    def partition_dir(self, year: int) -> str:
+        return os.path.join(self.root, f'year={year}')
+
+    def partitions(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.root, 'year=*')))
+
+    def files(self, partition: Optional[str] = None) -> List[str]:
+        """Data files in write order: each partition's base file first, then its deltas by creation time."""
+        partitions = [partition] if partition else self.partitions()
+        return [path for part in partitions for path in sorted(glob.glob(os.path.join(part, '*.parquet')))]
+
+    def exists(self) -> bool:
+        return bool(self.files())
+
+    def common_columns(self) -> List[str]:
+        """Columns present in every data file, read from the Parquet footers only."""
+        columns = None
+        for path in self.files():
+            file_columns = list(pl.read_parquet_schema(path))
+            columns = file_columns if columns is None else [c for c in columns if c in file_columns]
+        return columns or []
+
+    def last_modified(self) -> float:
+        """Latest mtime of any data file (0 if the store is empty)."""
+        return max((os.path.getmtime(path) for path in self.files()), default=0.0)
+
+    def scan(self, dedupe: bool = True, symbols: Optional[List[str]] = None,
+             since: Optional[datetime] = None) -> pl.LazyFrame:
+        """Lazily read every partition; with dedupe, the earliest written row wins per (symbol, timestamp).
+
+        symbols and since filters are applied before deduplication so they are pushed down to the Parquet
+        reader; since also skips whole year partitions before it.
+        """
+        files = self.files()
+        if since is not None:
+            files = [path for path in files if self._partition_year(path) >= since.year]
+        if not files:
+            return pl.LazyFrame()
+        # Files written before a column was added read it as null
+        lf = pl.scan_parquet(files, missing_columns='insert')
+        if symbols is not None:
+            lf = lf.filter(pl.col('symbol').is_in(symbols))
+        if since is not None:
+            lf = lf.filter(pl.col('timestamp') >= since)
+        if dedupe:
+            lf = sort_and_dedupe(lf)
+        return lf
+
+    def append(self, df: pl.DataFrame) -> List[str]:
+        """Write new rows as one delta file per touched year partition and return the written paths."""
+        if df.is_empty():
+            return []
+        written = []
+        df = df.with_columns(pl.col('timestamp').dt.year().alias('_year'))
+        for (year,), part in df.partition_by('_year', as_dict=True).items():
+            os.makedirs(self.partition_dir(year), exist_ok=True)
+            # Nanosecond prefix keeps deltas in write order when listed
+            path = os.path.join(self.partition_dir(year), f'delta-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet')
+            part = part.drop('_year').sort(KEY_COLUMNS)
+            part.write_parquet(path, compression=self.compression, row_group_size=self.row_group_size)
+            written.append(path)
+        return written
+
+    def import_file(self, file_path: str):
+        """Split an existing single-file Parquet history into per-year base files."""
+        df = pl.read_parquet(file_path).with_columns(pl.col('timestamp').dt.year().alias('_year'))
+        for (year,), part in df.partition_by('_year', as_dict=True).items():
+            os.makedirs(self.partition_dir(year), exist_ok=True)
+            self._write_base(self.partition_dir(year), part.drop('_year').sort(KEY_COLUMNS))
+
+    def rewrite(self, df: pl.DataFrame):
+        """Replace the whole store with df (e.g. after adding columns to every row), one base file per year."""
+        old_files = self.files()
+        df = df.with_columns(pl.col('timestamp').dt.year().alias('_year'))
+        written = set()
+        for (year,), part in df.partition_by('_year', as_dict=True).items():
+            os.makedirs(self.partition_dir(year), exist_ok=True)
+            self._write_base(self.partition_dir(year), part.drop('_year').sort(KEY_COLUMNS))
+            written.add(os.path.join(self.partition_dir(year), BASE_FILE))
+        for path in old_files:
+            if path not in written:
+                os.remove(path)
+
+    def compact(self, max_deltas: int = 0) -> int:
+        """Fold deltas into the base file of every partition holding more than max_deltas of them.
+
+        Returns the number of partitions compacted.
+        """
+        compacted = 0
+        for partition in self.partitions():
+            files = self.files(partition)
+            deltas = [path for path in files if os.path.basename(path) != BASE_FILE]
+            if not deltas or len(deltas) <= max_deltas:
+                continue
+            # One lazy plan: only the partition's files are read, deduped and sorted
+            merged = sort_and_dedupe(pl.scan_parquet(files)).collect()
+            self._write_base(partition, merged)
+            # The new base already holds every delta's rows, so a crash here only leaves harmless duplicates
+            for path in deltas:
+                os.remove(path)
+            compacted += 1
+        return compacted
+
+    @staticmethod
+    def _partition_year(path: str) -> int:
+        return int(os.path.basename(os.path.dirname(path)).split('=', 1)[1])
+
+    def _write_base(self, partition: str, df: pl.DataFrame):
+        tmp_path = os.path.join(partition, BASE_FILE + '.tmp')
+        df.write_parquet(tmp_path, compression=self.compression, row_group_size=self.row_group_size)
+        os.replace(tmp_path, os.path.join(partition, BASE_FILE))
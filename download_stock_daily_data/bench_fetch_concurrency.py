@@ -0,0 +1,89 @@
+#!/usr/bin/env python3.10
+"""
+Benchmark wall-clock time vs. concurrency for the FetchEngine against a local mock Alpaca bars server.
+Usage: python bench_fetch_concurrency.py --symbols 100 --latency 0.05 --concurrency 1 2 5 10 20
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fetch_engine import FetchEngine
+
+
+def make_handler(latency: float, bars_per_symbol: int):
+    class MockAlpacaHandler(BaseHTTPRequestHandler):
+        """Serves /v2/stocks/{symbol}/bars with a fixed simulated latency."""
+
+        def do_GET(self):
+            time.sleep(latency)
+            symbol = self.path.split('/')[3]
+            bars = [{'t': f'2024-01-{(i % 28) + 1:02d}T05:00:00Z', 'o': 1.0, 'h': 1.0, 'l': 1.0, 'c': 1.0, 'v': 100}
+                    for i in range(bars_per_symbol)]
+            body = json.dumps({'bars': bars, 'symbol': symbol, 'next_page_token': None}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MockAlpacaHandler
+
+
+class MockAlpacaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Avoid the listen backlog capping measured concurrency
+
+
+def fetch_bars(base_url: str, symbol: str) -> int:
+    """Blocking fetch, standing in for alpaca_handler.get_stock_historical."""
+    with urllib.request.urlopen(f'{base_url}/v2/stocks/{symbol}/bars') as resp:
+        return len(json.loads(resp.read())['bars'])
+
+
+async def fetch_all(engine: FetchEngine, base_url: str, symbols):
+    semaphore = asyncio.Semaphore(engine.concurrency)
+
+    async def fetch_one(symbol):
+        async with semaphore:
+            return await engine.run(fetch_bars, base_url, symbol)
+
+    return await asyncio.gather(*(fetch_one(symbol) for symbol in symbols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated server latency in seconds')
+    parser.add_argument('--bars', type=int, default=250, help='Bars returned per symbol')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 5, 10, 20])
+    args = parser.parse_args()
+
+    server = MockAlpacaServer(('127.0.0.1', 0), make_handler(args.latency, args.bars))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    symbols = [f'SYM{i}' for i in range(args.symbols)]
+
+    print(f"{'concurrency':>11} {'wall (s)':>9} {'req/s':>8} {'speedup':>8}")
+    baseline = None
+    for concurrency in args.concurrency:
+        engine = FetchEngine(concurrency=concurrency)
+        start = time.perf_counter()
+        asyncio.run(fetch_all(engine, base_url, symbols))
+        elapsed = time.perf_counter() - start
+        engine.shutdown()
+        baseline = baseline or elapsed
+        print(f"{concurrency:>11} {elapsed:>9.3f} {len(symbols) / elapsed:>8.1f} {baseline / elapsed:>7.1f}x")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
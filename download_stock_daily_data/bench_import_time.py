@@ -0,0 +1,65 @@
+#!/usr/bin/env python3.10
+"""
+Benchmark the cost of `import daily_bar_downloader` in a fresh interpreter and fail if it exceeds a budget.
+Importing must not touch the network or build clients (see BarPipeline), so this should stay close to
+the cost of importing pandas and polars.
+Usage: python bench_import_time.py --runs 5 --budget-ms 1500
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULE = 'daily_bar_downloader'
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def time_import(module: str) -> float:
+    """Wall time (seconds) of a fresh interpreter importing module, minus a bare interpreter start."""
+    def run(code: str) -> float:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=HERE, check=True)
+        return time.perf_counter() - start
+    return run(f'import {module}') - run('pass')
+
+
+def slowest_imports(module: str, top: int):
+    """Slowest direct imports of module reported by -X importtime, as (cumulative microseconds, name) pairs."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=HERE, check=True, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # One nesting level below module: its own imports, whose cumulative times add up to its total
+        if name.startswith('   ') and not name.startswith('    '):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--module', default=MODULE)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1500)
+    parser.add_argument('--top', type=int, default=8, help='Show the slowest direct imports of the module')
+    args = parser.parse_args()
+
+    timings = [time_import(args.module) * 1000 for _ in range(args.runs)]
+    median_ms = statistics.median(timings)
+    print(f"import {args.module}: median {median_ms:.0f} ms, min {min(timings):.0f} ms over {args.runs} runs "
+          f"(budget {args.budget_ms:.0f} ms)")
+    for cumulative_us, name in slowest_imports(args.module, args.top):
+        print(f"{cumulative_us / 1000:>9.1f} ms  {name}")
+
+    if median_ms > args.budget_ms:
+        print(f"Import time over budget by {median_ms - args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3.10
+"""
+Benchmark the daily merge: legacy pandas path (read whole file -> to_pandas -> concat/dedupe/sort -> from_pandas -> rewrite),
+the same full rewrite as one lazy Polars plan (polars-full), and the store path (append one delta to the
+partitioned store, then lazily compact the touched partition).
+Each path runs in its own process so peak RSS is comparable.
+Usage: python bench_merge_path.py --symbols 800 --years 20
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from bar_store import BarStore, sort_and_dedupe
+
+LEGACY_FILE = 'stock_daily_ohlc.parquet'
+NEW_DAY_FILE = 'new_day.parquet'
+
+
+def make_bars(symbols: int, days: int, end: datetime) -> pl.DataFrame:
+    """Synthetic daily bars for `symbols` tickers over `days` business days ending at `end`."""
+    dates = pl.datetime_range(end - timedelta(days=int(days * 1.45) + 7), end, interval='1d',
+                              time_zone='UTC', eager=True)
+    dates = dates.filter(dates.dt.weekday() <= 5).tail(days)
+    n = len(dates)
+    rng = np.random.default_rng(0)
+    close = rng.uniform(10, 500, symbols * n)
+    return pl.DataFrame({
+        'symbol': np.repeat([f'SYM{i:04d}' for i in range(symbols)], n),
+        'timestamp': pl.concat([dates] * symbols),
+        'open': close * 0.99,
+        'high': close * 1.01,
+        'low': close * 0.98,
+        'close': close,
+        'volume': rng.integers(1_000, 10_000_000, symbols * n).astype(float),
+        'trade_count': rng.integers(10, 100_000, symbols * n).astype(float),
+        'vwap': close,
+    })
+
+
+def run_legacy(workdir: str):
+    import pandas as pd
+    existing = pl.read_parquet(os.path.join(workdir, LEGACY_FILE)).to_pandas()
+    new_data = pl.read_parquet(os.path.join(workdir, NEW_DAY_FILE)).to_pandas()
+    combined = pd.concat([existing, new_data], ignore_index=True)
+    combined.drop_duplicates(subset=['symbol', 'timestamp'], inplace=True)
+    combined.sort_values(by=['symbol', 'timestamp'], inplace=True)
+    pl.from_pandas(combined).write_parquet(os.path.join(workdir, LEGACY_FILE), compression='snappy')
+
+
+def run_polars(workdir: str):
+    store = BarStore(os.path.join(workdir, 'store'))
+    new_data = pl.read_parquet(os.path.join(workdir, NEW_DAY_FILE))
+    store.append(new_data.unique(subset=['symbol', 'timestamp'], keep='first', maintain_order=True))
+    store.compact(max_deltas=0)
+
+
+def run_polars_full(workdir: str):
+    # Same full rewrite as the legacy path, but as one lazy Polars plan without pandas
+    merged = sort_and_dedupe(pl.concat([
+        pl.scan_parquet(os.path.join(workdir, LEGACY_FILE)),
+        pl.scan_parquet(os.path.join(workdir, NEW_DAY_FILE)),
+    ])).collect()
+    merged.write_parquet(os.path.join(workdir, 'stock_daily_ohlc_polars.parquet'), compression='snappy')
+
+
+def setup(workdir: str, symbols: int, years: int):
+    end = datetime(2024, 6, 28)
+    history = make_bars(symbols, years * 252, end)
+    history.write_parquet(os.path.join(workdir, LEGACY_FILE), compression='snappy')
+    BarStore(os.path.join(workdir, 'store')).import_file(os.path.join(workdir, LEGACY_FILE))
+    make_bars(symbols, 1, end + timedelta(days=3)).write_parquet(os.path.join(workdir, NEW_DAY_FILE))
+    print(f"History: {history.height:,} rows ({symbols} symbols x {years} years)")
+
+
+def run_child(*child_args) -> str:
+    # Separate processes: ru_maxrss would otherwise include the parent's synthetic dataset
+    return subprocess.run([sys.executable, os.path.abspath(__file__), '--child', *child_args],
+                          check=True, capture_output=True, text=True).stdout.strip()
+
+
+def child(mode: str, workdir: str, symbols: str, years: str):
+    if mode == 'setup':
+        setup(workdir, int(symbols), int(years))
+        return
+    start = time.perf_counter()
+    {'legacy': run_legacy, 'polars-full': run_polars_full, 'polars': run_polars}[mode](workdir)
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    print(json.dumps({'mode': mode, 'seconds': elapsed, 'peak_rss_mb': peak_mb}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--symbols', type=int, default=800)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--child', nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        sizes = (str(args.symbols), str(args.years))
+        print(run_child('setup', workdir, *sizes))
+        print(f"{'path':>11} {'wall (s)':>9} {'peak RSS (MB)':>14}")
+        for mode in ('legacy', 'polars-full', 'polars'):
+            result = json.loads(run_child(mode, workdir, *sizes).splitlines()[-1])
+            print(f"{mode:>11} {result['seconds']:>9.2f} {result['peak_rss_mb']:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
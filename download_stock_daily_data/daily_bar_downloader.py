@@ -1,11 +1,13 @@
 #!/usr/bin/env python3.10
 """
 Download Historical & Update the latest Stock Daily Data,
-Store Local Parquet (one file), breakdown to JSON files by ticker in both local folder and S3 bucket.
+Store Local Parquet (partitioned by year, append-only), breakdown to JSON files by ticker in both local folder and S3 bucket.
 API created under chalice_taiapi
 """
 
 import asyncio
+import functools
+import io
 import pandas as pd
 import polars as pl
 import time
@@ -13,12 +15,19 @@ import json
 import os
 import math
 import logging
+import sys
 from datetime import datetime, timedelta, date
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future
 from typing import List, Tuple, Dict, Any
 
-from TAI.source import alpaca
-from TAI.data import DataMaster
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import get_current_rss_mb, get_peak_rss_mb, incr, start_run, timer
+from common.rate_limiter import get_rate_limiter
+from common.s3_upload import JSON_CONTENT_ENCODING, get_uploader
+from bar_store import BarStore
+from indicators import INDICATOR_COLUMNS, TAIL_CALENDAR_DAYS, compute_indicators
+from fetch_engine import FetchEngine
+from universe import UniverseDiff, UniverseResolver
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
@@ -27,18 +36,35 @@ logger = logging.getLogger(__name__)
 # Set global variables directly in the code
 LOOKBACK_YEARS = 20  # Number of years to look back
 PRINT_LOG = False     # Enable detailed logging
-MAX_CONCURRENT_REQUESTS = 5  # Max concurrent requests
+MAX_CONCURRENT_REQUESTS = 5  # Max concurrent requests (Alpaca calls in flight)
 BATCH_SIZE = 50      # Batch size for data fetching
-PARQUET_FILE = 'stock_daily_ohlc.parquet'  # Parquet file name
+BATCHED_REQUESTS = True  # Send each batch as multi-symbol requests instead of one request per ticker
+ALPACA_PAGE_LIMIT = 10000  # Bars per page of Alpaca's bars endpoint; a call larger than this pages through several requests
+PARQUET_FILE = 'stock_daily_ohlc.parquet'  # Legacy single-file Parquet, imported into STORE_DIR once
+STORE_DIR = 'data/stock_daily_ohlc'  # Partitioned Parquet store (year=YYYY/*.parquet)
+COMPACT_MAX_DELTAS = 20  # Compact a year partition once it holds more delta files than this
+HWM_FILE = 'stock_daily_ohlc_hwm.json'  # Per-symbol last timestamp index, kept next to the Parquet store
 JSON_DIR = 'data/stock_daily_bar'  # Directory to store JSON files
+WRITE_LOCAL_JSON = False  # Also keep a local copy of each uploaded JSON file in JSON_DIR
+S3_BUCKET = 'jtrade1-dir'
+S3_JSON_PREFIX = 'api/stock_daily_bar'  # S3 folder of the per-ticker JSON files
+EXPORT_COLUMNAR_JSON = False  # Also publish one-array-per-field JSON under S3_COLUMNAR_JSON_PREFIX
+S3_COLUMNAR_JSON_PREFIX = 'api/stock_daily_bar_columnar'
+EXPORT_ARROW = True  # Also publish each ticker as an uncompressed Arrow IPC file (memory-mappable, see bar_reader.py)
+S3_ARROW_PREFIX = 'api/stock_daily_bar_arrow'
+WRITE_LOCAL_ARROW = False  # Also keep a local copy of each uploaded Arrow file in ARROW_DIR
+ARROW_DIR = 'data/stock_daily_bar_arrow'
+EXPORT_MANIFEST_FILE = 'stock_daily_bar_manifest.json'  # Per-symbol version of the last exported JSON
+FORCE_FULL_EXPORT = False  # Ignore the manifest and re-export every symbol (e.g. after a serializer change; format and encoding changes are part of the version)
+EXPORT_MEMORY_LIMIT_MB = 512  # Ceiling on export memory above the process's RSS when the export starts
+EXPORT_UPLOAD_SHARE = 0.4  # Part of the limit for serialized bodies not yet uploaded; the rest holds the chunk's bars
+EXPORT_BYTES_PER_ROW = 700  # RSS a bar costs while read, deduplicated and split by symbol (measured); raised if a chunk costs more
 
 if PRINT_LOG:
     logger.setLevel(logging.DEBUG)
 else:
     logger.setLevel(logging.INFO)
 
-dm = DataMaster()
-
 def get_lookback_period_in_days() -> Tuple[int, datetime]:
     """Calculate the number of days to look back from the start date."""
     today = date.today()
@@ -48,77 +74,16 @@ def get_lookback_period_in_days() -> Tuple[int, datetime]:
 
 LOOKBACK_PERIOD_DAYS, START_DATE = get_lookback_period_in_days()
 
-def get_sp500_symbols() -> List[str]:
-    """Fetches the list of S&P 500 company symbols from Wikipedia or from local CSV if the site is down."""
-    csv_file = 'sp500_symbols.csv'
-    try:
-        # Check if CSV is recent (e.g., within the last week)
-        if os.path.exists(csv_file):
-            file_mod_time = datetime.fromtimestamp(os.path.getmtime(csv_file))
-            if datetime.now() - file_mod_time < timedelta(days=7):
-                sp500_df = pd.read_csv(csv_file)
-                symbols = sp500_df['Symbol'].tolist()
-                symbols = [symbol.replace('.', '-') for symbol in symbols]
-                logger.info(f"Loaded S&P 500 symbols from {csv_file}")
-                return symbols
-        # Fetch from Wikipedia
-        sp500_url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-        sp500_tables = pd.read_html(sp500_url)
-        sp500_df = sp500_tables[0]
-        symbols = sp500_df['Symbol'].tolist()
-        symbols = [symbol.replace('.', '-') for symbol in symbols]
-        # Save to CSV
-        sp500_df.to_csv(csv_file, index=False)
-        logger.info(f"S&P 500 symbols fetched from Wikipedia and saved to {csv_file}")
-        return symbols
-    except Exception as e:
-        logger.error(f"Error fetching S&P 500 symbols from Wikipedia: {e}")
-        # Try to load from CSV
-        if os.path.exists(csv_file):
-            sp500_df = pd.read_csv(csv_file)
-            symbols = sp500_df['Symbol'].tolist()
-            symbols = [symbol.replace('.', '-') for symbol in symbols]
-            logger.info(f"Loaded S&P 500 symbols from {csv_file}")
-            return symbols
-        else:
-            logger.error(f"No local CSV file {csv_file} found.")
-            return []
-
-def get_nasdaq100_symbols() -> List[str]:
-    """Fetch NASDAQ-100 symbols from Wikipedia or from local CSV if the site is down."""
-    csv_file = 'nasdaq100_symbols.csv'
-    try:
-        # Check if CSV is recent (e.g., within the last week)
-        if os.path.exists(csv_file):
-            file_mod_time = datetime.fromtimestamp(os.path.getmtime(csv_file))
-            if datetime.now() - file_mod_time < timedelta(days=7):
-                nasdaq100_df = pd.read_csv(csv_file)
-                symbols = nasdaq100_df['Ticker'].tolist()
-                symbols = [symbol.replace('.', '-') for symbol in symbols]
-                logger.info(f"Loaded NASDAQ-100 symbols from {csv_file}")
-                return symbols
-        # Fetch from Wikipedia
-        url = 'https://en.wikipedia.org/wiki/NASDAQ-100'
-        tables = pd.read_html(url)
-        nasdaq100_df = tables[4]  # Adjust the index if necessary
-        symbols = nasdaq100_df['Ticker'].tolist()
-        symbols = [symbol.replace('.', '-') for symbol in symbols]
-        # Save to CSV
-        nasdaq100_df.to_csv(csv_file, index=False)
-        logger.info(f"NASDAQ-100 symbols fetched from Wikipedia and saved to {csv_file}")
-        return symbols
-    except Exception as e:
-        logger.error(f"Error fetching NASDAQ-100 symbols from Wikipedia: {e}")
-        # Try to load from CSV
-        if os.path.exists(csv_file):
-            nasdaq100_df = pd.read_csv(csv_file)
-            symbols = nasdaq100_df['Ticker'].tolist()
-            symbols = [symbol.replace('.', '-') for symbol in symbols]
-            logger.info(f"Loaded NASDAQ-100 symbols from {csv_file}")
-            return symbols
-        else:
-            logger.error(f"No local CSV file {csv_file} found.")
-            return []
+def get_delta_lookback_days(start_date: datetime) -> int:
+    """Number of days to request so the fetch window starts at start_date (delta fetch)."""
+    lookback_days = (date.today() - start_date.date()).days
+    return min(max(lookback_days, 1), LOOKBACK_PERIOD_DAYS)
+
+def symbols_per_request(start_date: datetime) -> int:
+    """Number of symbols whose bars from start_date fit in one page, so a multi-symbol call is a single HTTP
+    request and its limiter token stands for one request (a 20-year history alone still fits in a page)."""
+    bars_per_symbol = get_delta_lookback_days(start_date) * 5 // 7 + 1  # Weekdays, an upper bound on trading days
+    return max(1, ALPACA_PAGE_LIMIT // bars_per_symbol)
 
 def get_popular_stock_symbols() -> List[str]:
     """Returns a list of commonly traded stocks outside the S&P 500."""
@@ -193,17 +158,49 @@ def get_common_etf_symbols() -> List[str]:
     ]
     return etf_symbols
 
-# Fetch symbols
-sp500_symbols = get_sp500_symbols()
-nasdaq100_symbols = get_nasdaq100_symbols()
-etf_symbols = get_common_etf_symbols()
-popular_stocks = get_popular_stock_symbols()
+def get_symbol_universe() -> UniverseDiff:
+    """Combine the S&P 500 and NASDAQ-100 constituents, popular stocks and ETFs, diffed against the last run."""
+    return UniverseResolver().resolve(static_symbols=get_common_etf_symbols() + get_popular_stock_symbols())
+
+class BarPipeline:
+    """Clients, store and symbol universe of the daily bar pipeline, each created on first use.
+
+    Importing this module does no network or client setup; the Wikipedia scrape, the Alpaca client and the
+    thread pool are only paid for by the code paths that need them.
+    """
 
-# Combine symbols and remove duplicates
-symbols = list(set(sp500_symbols + nasdaq100_symbols + etf_symbols + popular_stocks))
+    def __init__(self, store_dir: str = STORE_DIR, concurrency: int = MAX_CONCURRENT_REQUESTS):
+        self.store_dir = store_dir
+        self.concurrency = concurrency
 
-# Initialize Alpaca class instance
-alpaca_handler = alpaca.Alpaca()
+    @functools.cached_property
+    def universe(self) -> UniverseDiff:
+        return get_symbol_universe()
+
+    @property
+    def symbols(self) -> List[str]:
+        return self.universe.symbols
+
+    @functools.cached_property
+    def alpaca_handler(self):
+        from TAI.source import alpaca
+        return alpaca.Alpaca()
+
+    @functools.cached_property
+    def fetch_engine(self) -> FetchEngine:
+        # Thread pool that keeps `concurrency` blocking Alpaca calls in flight
+        return FetchEngine(concurrency=self.concurrency, thread_name_prefix='alpaca-fetch')
+
+    @functools.cached_property
+    def alpaca_limiter(self):
+        # Shared Alpaca quota for every fetch in this process
+        return get_rate_limiter('alpaca')
+
+    @functools.cached_property
+    def bar_store(self) -> BarStore:
+        return BarStore(self.store_dir)
+
+pipeline = BarPipeline()
 
 def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     """Clean the DataFrame by handling NaNs and invalid data."""
@@ -211,62 +208,91 @@ def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     df = df[df['volume'] > 0]  # Exclude entries with zero volume
     return df
 
-async def fetch_stock_data(semaphore: asyncio.Semaphore, symbol: str, start_date: datetime) -> Tuple[str, pd.DataFrame]:
-    """Asynchronously fetch historical stock data with exponential backoff."""
+async def request_bars(semaphore: asyncio.Semaphore, symbol_or_symbols, start_date: datetime) -> pd.DataFrame:
+    """Request daily bars from start_date onwards for one or more symbols through the shared Alpaca rate limiter."""
+    lookback_days = get_delta_lookback_days(start_date)
     async with semaphore:
-        max_retries = 5
-        retry_delay = 1  # Start with 1 second
-        for attempt in range(max_retries):
-            try:
-                # Fetch historical data
-                if PRINT_LOG:
-                    logger.debug(f"Fetching data for {symbol} starting from {start_date.date()}...")
-                data = alpaca_handler.get_stock_historical(
-                    symbol_or_symbols=symbol,
-                    lookback_period=LOOKBACK_PERIOD_DAYS,
-                    end=datetime.now(),
-                    timeframe='Day',
-                    ohlc=True
-                )
-                if data.empty:
-                    raise ValueError(f"No data returned for {symbol}")
-                data = clean_data(data)
-                return symbol, data
-            except Exception as e:
-                if 'rate limit' in str(e).lower() or 'too many requests' in str(e).lower():
-                    await asyncio.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                else:
-                    logger.error(f"Error fetching data for {symbol}: {e}")
-                    return symbol, None
-        # After max retries
-        logger.error(f"Max retries reached for {symbol}")
+        # Fetch historical data
+        if PRINT_LOG:
+            logger.debug(f"Fetching data for {symbol_or_symbols} starting from {start_date.date()}...")
+        # The limiter spaces requests and retries rate-limit errors after one shared backoff
+        return await pipeline.fetch_engine.run(
+            pipeline.alpaca_limiter.call,
+            pipeline.alpaca_handler.get_stock_historical,
+            symbol_or_symbols=symbol_or_symbols,
+            lookback_period=lookback_days,
+            end=datetime.now(),
+            timeframe='Day',
+            ohlc=True
+        )
+
+async def fetch_stock_data(semaphore: asyncio.Semaphore, symbol: str, start_date: datetime) -> Tuple[str, pd.DataFrame]:
+    """Asynchronously fetch stock data for one symbol from start_date onwards.
+
+    Returns an empty frame when the request succeeds with no bars (no new data), None when it fails.
+    """
+    try:
+        with timer('stock.fetch'):
+            data = await request_bars(semaphore, symbol, start_date)
+        if data.empty:
+            return symbol, pd.DataFrame()
+        data = clean_data(data)
+        return symbol, data
+    except Exception as e:
+        logger.error(f"Error fetching data for {symbol}: {e}")
         return symbol, None
 
-async def fetch_latest_data_in_batches(symbols: List[str], existing_data: pd.DataFrame, batch_size: int) -> Tuple[List[pd.DataFrame], List[str]]:
+async def fetch_stock_data_batch(semaphore: asyncio.Semaphore, symbols: List[str], start_date: datetime) -> List[Tuple[str, pd.DataFrame]]:
+    """Fetch several symbols in one multi-symbol request, falling back to per-symbol requests for any missing.
+
+    An empty response to a successful request means no new bars for any of them (weekend, holiday), not a failure.
+    """
+    by_symbol = {}
+    try:
+        with timer('stock.fetch_batch'):
+            data = await request_bars(semaphore, symbols, start_date)
+        if data.empty:
+            return [(symbol, pd.DataFrame()) for symbol in symbols]
+        if 'symbol' not in data.columns:
+            # Multi-symbol responses may come back indexed by (symbol, timestamp)
+            data = data.reset_index()
+        by_symbol = {symbol: group for symbol, group in clean_data(data).groupby('symbol')}
+    except Exception as e:
+        logger.warning(f"Batch request for {len(symbols)} symbols failed, falling back to per-symbol requests: {e}")
+
+    results = [(symbol, by_symbol[symbol]) for symbol in symbols if symbol in by_symbol]
+    retry_symbols = [symbol for symbol in symbols if symbol not in by_symbol]
+    if retry_symbols:
+        if PRINT_LOG:
+            logger.debug(f"Retrying {len(retry_symbols)} symbols individually: {retry_symbols}")
+        results.extend(await asyncio.gather(
+            *(fetch_stock_data(semaphore, symbol, start_date) for symbol in retry_symbols)
+        ))
+    return results
+
+async def fetch_latest_data_in_batches(symbols: List[str], high_water_marks: Dict[str, pd.Timestamp], batch_size: int) -> Tuple[List[pd.DataFrame], List[str]]:
     """Fetch latest data for symbols asynchronously in batches."""
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    # Same bound as the fetch thread pool, so BarPipeline(concurrency=...) sets both
+    semaphore = asyncio.Semaphore(pipeline.concurrency)
     total_symbols = len(symbols)
     num_batches = math.ceil(total_symbols / batch_size)
     all_successful_results = []
     all_failed_symbols = []
+    request_count = 0
 
     for i in range(num_batches):
         batch_symbols = symbols[i*batch_size : (i+1)*batch_size]
         tasks = []
+        # Symbols sharing a start date can go in one multi-symbol request
+        symbols_by_start = {}
 
         for symbol in batch_symbols:
             # Determine the start date for each symbol
-            if not existing_data.empty and 'symbol' in existing_data.columns:
-                if symbol in existing_data['symbol'].unique():
-                    last_date = existing_data[existing_data['symbol'] == symbol]['timestamp'].max()
-                    start_date = pd.to_datetime(last_date) + timedelta(days=1)
-                else:
-                    # If the symbol is not in existing data, fetch data from the default start date
-                    start_date = START_DATE
+            last_date = high_water_marks.get(symbol)
+            if last_date is not None:
+                start_date = pd.to_datetime(last_date) + timedelta(days=1)
             else:
-                # existing_data is empty or does not have 'symbol' column
+                # If the symbol is not in existing data, fetch data from the default start date
                 start_date = START_DATE
 
             # Skip if start_date is after today
@@ -275,9 +301,23 @@ async def fetch_latest_data_in_batches(symbols: List[str], existing_data: pd.Dat
                     logger.debug(f"No new data for {symbol}.")
                 continue
 
-            tasks.append(fetch_stock_data(semaphore, symbol, start_date))
+            symbols_by_start.setdefault(start_date, []).append(symbol)
 
-        results = await asyncio.gather(*tasks)
+        for start_date, start_symbols in symbols_by_start.items():
+            # Backfills split into requests of a page each; daily deltas still go in one request per batch
+            per_request = symbols_per_request(start_date) if BATCHED_REQUESTS else 1
+            for j in range(0, len(start_symbols), per_request):
+                request_symbols = start_symbols[j:j + per_request]
+                if len(request_symbols) > 1:
+                    tasks.append(fetch_stock_data_batch(semaphore, request_symbols, start_date))
+                else:
+                    tasks.append(fetch_stock_data(semaphore, request_symbols[0], start_date))
+        request_count += len(tasks)
+
+        results = []
+        for result in await asyncio.gather(*tasks):
+            # Batched tasks return a list of (symbol, data) pairs
+            results.extend(result if isinstance(result, list) else [result])
         successful_results = []
         failed_symbols = []
 
@@ -291,40 +331,101 @@ async def fetch_latest_data_in_batches(symbols: List[str], existing_data: pd.Dat
         all_successful_results.extend(successful_results)
         all_failed_symbols.extend(failed_symbols)
 
+    logger.info(f"Issued {request_count} bar requests for {total_symbols} symbols (excluding per-symbol fallbacks)")
     return all_successful_results, all_failed_symbols
 
+def log_transfer_stats(results: List[pd.DataFrame]):
+    """Log the rows fetched by this run and their in-memory size (pandas memory_usage, not bytes on the wire)."""
+    rows = sum(len(df) for df in results)
+    num_bytes = sum(int(df.memory_usage(deep=True).sum()) for df in results)
+    incr('rows', rows, stage='fetched')
+    incr('fetched_memory_bytes', num_bytes)
+    logger.info(f"Fetched {rows} rows ({num_bytes / 1024 / 1024:.2f} MB in memory) for {len(results)} symbols")
+
+def drop_stored_rows(new_data: pl.DataFrame, high_water_marks: Dict[str, pd.Timestamp]) -> pl.DataFrame:
+    """Drop fetched bars at or before each symbol's high-water mark; the request window (at least a day)
+    can reach back over bars that are already stored."""
+    if not high_water_marks or new_data.is_empty():
+        return new_data
+    marks = pl.from_pandas(pd.DataFrame({
+        'symbol': list(high_water_marks),
+        'hwm': pd.to_datetime(list(high_water_marks.values()), utc=True),
+    })).with_columns(pl.col('hwm').cast(new_data.schema['timestamp']))
+    return (
+        new_data.join(marks, on='symbol', how='left')
+        .filter(pl.col('hwm').is_null() | (pl.col('timestamp') > pl.col('hwm')))
+        .drop('hwm')
+    )
+
+@timer('stock.update')
 def update_parquet_with_latest_data():
-    """Update the Parquet file with the latest data for all tickers."""
+    """Append the latest data for all tickers to the partitioned Parquet store."""
     # Record the start time
     start_time = time.time()
 
-    # Check if Parquet file exists
-    if os.path.exists(os.path.join('data', PARQUET_FILE)):
-        # Read existing data using Polars
-        existing_data = load_data_from_parquet(os.path.join('data', PARQUET_FILE))
-    else:
-        # If file doesn't exist, create an empty DataFrame
-        existing_data = pd.DataFrame()
+    # One-time migration of the legacy single-file history into the partitioned store
+    legacy_path = os.path.join('data', PARQUET_FILE)
+    if not pipeline.bar_store.exists() and os.path.exists(legacy_path):
+        logger.info(f"Importing {PARQUET_FILE} into {STORE_DIR}")
+        pipeline.bar_store.import_file(legacy_path)
+
+    # One-time backfill of the indicator columns over a store written before they existed
+    ensure_indicators()
+
+    # Plan the resume point of each symbol from the index instead of the full table
+    high_water_marks = load_high_water_marks()
+    # Tickers that joined the universe since the last run: never-stored ones have no mark and get their full
+    # history, re-added ones resume from their old mark, which fetches exactly the gap since they left;
+    # removed tickers are simply no longer in pipeline.symbols
+    if pipeline.universe.added:
+        logger.info(f"Fetching {len(pipeline.universe.added)} newly added symbols: {pipeline.universe.added}")
+    if pipeline.universe.removed:
+        logger.info(f"No longer fetching {len(pipeline.universe.removed)} removed symbols: {pipeline.universe.removed}")
 
     # Run async fetch for latest data in batches
     loop = asyncio.get_event_loop()
-    successful_results, failed_symbols = loop.run_until_complete(
-        fetch_latest_data_in_batches(symbols, existing_data, batch_size=BATCH_SIZE)
-    )
+    with timer('stock.fetch_all'):
+        successful_results, failed_symbols = loop.run_until_complete(
+            fetch_latest_data_in_batches(pipeline.symbols, high_water_marks, batch_size=BATCH_SIZE)
+        )
+    pipeline.fetch_engine.shutdown()
+    incr('symbols_failed', len(failed_symbols), stage='fetch')
 
+    log_transfer_stats(successful_results)
+
+    new_data = pl.DataFrame()
     if successful_results:
-        # Combine new data
-        new_data = pd.concat(successful_results, ignore_index=True)
-        # Combine with existing data
-        combined_df = pd.concat([existing_data, new_data], ignore_index=True)
-        # Remove duplicates
-        combined_df.drop_duplicates(subset=['symbol', 'timestamp'], inplace=True)
-        # Sort the data
-        combined_df.sort_values(by=['symbol', 'timestamp'], inplace=True)
-        # Store the data in Parquet
-        store_data_in_parquet(combined_df, PARQUET_FILE)
+        # Combine new data in Polars; the merge path never goes back through pandas
+        with timer('stock.merge'):
+            new_data = (
+                pl.concat([pl.from_pandas(df) for df in successful_results], how='vertical_relaxed')
+                .unique(subset=['symbol', 'timestamp'], keep='first', maintain_order=True)
+            )
+            new_data = drop_stored_rows(new_data, high_water_marks)
+
+    if not new_data.is_empty():
+        with timer('stock.indicators'):
+            new_data = add_indicators(new_data, high_water_marks)
+        # Write only the new rows as delta files; overlaps with stored rows are resolved on read/compaction
+        with timer('stock.store'):
+            written = store_data_in_parquet(new_data)
+        incr('rows', new_data.height, stage='stored')
+        # Advance the resume index with this run's last timestamps (only reached once the append succeeded)
+        last_timestamps = new_data.group_by('symbol').agg(pl.col('timestamp').max())
+        for symbol, last_timestamp in last_timestamps.iter_rows():
+            last_timestamp = pd.Timestamp(last_timestamp)
+            if symbol not in high_water_marks or last_timestamp > high_water_marks[symbol]:
+                high_water_marks[symbol] = last_timestamp
+        save_high_water_marks(high_water_marks)
+        logger.info(f"Appended {new_data.height} rows in {len(written)} delta files")
     else:
-        logger.info("No new data was fetched.")
+        logger.info("No new bars to store.")
+
+    # Periodic compaction keeps the number of files per partition bounded
+    with timer('stock.compact'):
+        compacted = pipeline.bar_store.compact(max_deltas=COMPACT_MAX_DELTAS)
+    if compacted:
+        logger.info(f"Compacted {compacted} partitions")
 
     # Print failed symbols if there were any errors
     if failed_symbols:
@@ -335,75 +436,281 @@ def update_parquet_with_latest_data():
     total_time = end_time - start_time
     logger.info(f"Update completed in {total_time:.2f} seconds")
 
-def store_data_in_parquet(df: pd.DataFrame, file_name: str):
-    """Store the DataFrame in Parquet format using Polars with compression."""
-    if df.empty:
-        logger.info("No data to store.")
+def add_indicators(new_data: pl.DataFrame, high_water_marks: Dict[str, pd.Timestamp]) -> pl.DataFrame:
+    """Compute the indicator columns of the new rows from the stored tail of each updated symbol."""
+    new_symbols = new_data['symbol'].unique().to_list()
+    resume_points = [high_water_marks[symbol] for symbol in new_symbols if symbol in high_water_marks]
+    tail = None
+    if resume_points:
+        # Only the last few hundred bars per symbol feed the rolling windows; the stored peak_close carries the rest
+        since = min(resume_points) - timedelta(days=TAIL_CALENDAR_DAYS)
+        tail = pipeline.bar_store.scan(symbols=new_symbols, since=since).collect()
+    return compute_indicators(new_data, tail)
+
+def ensure_indicators():
+    """Rewrite the store with indicator columns if any of its files predates them."""
+    if not pipeline.bar_store.exists() or set(INDICATOR_COLUMNS) <= set(pipeline.bar_store.common_columns()):
         return
+    start_time = time.time()
+    history = pipeline.bar_store.scan().collect()
+    pipeline.bar_store.rewrite(compute_indicators(history))
+    logger.info(f"Backfilled indicators for {history.height} rows in {time.time() - start_time:.2f} seconds")
 
-    try:
-        dm.create_dir()
-        pl_df = pl.from_pandas(df)
-        pl_df.write_parquet(os.path.join('data', file_name), compression='snappy')
-        if PRINT_LOG:
-            logger.debug(f"Data successfully stored in {file_name} using Polars with compression")
-    except Exception as e:
-        logger.error(f"Error storing data to Parquet: {e}")
-
-def load_data_from_parquet(file_path: str) -> pd.DataFrame:
-    """Load data from Parquet file using Polars."""
-    if os.path.exists(file_path):
-        pl_df = pl.read_parquet(file_path)
-        df = pl_df.to_pandas()
-        return df
+def store_data_in_parquet(df: pl.DataFrame) -> List[str]:
+    """Append the Polars DataFrame to the partitioned Parquet store as delta files.
+
+    Write errors propagate: the caller must not advance the high-water marks past rows that were not stored.
+    """
+    if df.is_empty():
+        logger.info("No data to store.")
+        return []
+
+    written = pipeline.bar_store.append(df)
+    if PRINT_LOG:
+        logger.debug(f"Data successfully stored in {written}")
+    return written
+
+def load_data_from_parquet(symbols: List[str] = None) -> pl.DataFrame:
+    """Load the deduplicated, sorted history (optionally only some symbols) from the partitioned Parquet store using Polars."""
+    if pipeline.bar_store.exists():
+        return pipeline.bar_store.scan(symbols=symbols).collect()
     else:
-        return pd.DataFrame()
-
-def save_group_to_json(group: pd.DataFrame, symbol: str) -> str:
-    """Save grouped data to JSON without compression."""
-    group = group.copy()
-    group['date'] = group['timestamp'].dt.strftime('%Y-%m-%d')
-    group.drop(columns=['timestamp'], inplace=True)
-    json_records = group.to_dict(orient='records')
-    json_file_name = f'{symbol}.json'
-    local_file_path = os.path.join(JSON_DIR, json_file_name)
-    os.makedirs(JSON_DIR, exist_ok=True)
-    with open(local_file_path, 'w', encoding='utf-8') as f:
-        json.dump(json_records, f)
-    return local_file_path
-
-def process_and_save_symbol(grouped_data: Tuple[str, pd.DataFrame]):
-    """Process and save data for a single symbol."""
-    symbol, group = grouped_data
-    local_file_path = save_group_to_json(group, symbol)
-    # Load JSON data to pass to dm.save_s3
-    with open(local_file_path, 'r', encoding='utf-8') as f:
-        json_data = json.load(f)
-    dm.save_s3(
-        json_data,
-        'jtrade1-dir',
-        'api/stock_daily_bar',
-        symbol + '.json',
-        use_polars=False,
-        delete_local=True
+        return pl.DataFrame()
+
+def compute_high_water_marks() -> Dict[str, pd.Timestamp]:
+    """Compute each symbol's last timestamp with one lazy group-by over only the symbol/timestamp columns."""
+    hwm_df = (
+        pipeline.bar_store.scan(dedupe=False)
+        .select(['symbol', 'timestamp'])
+        .group_by('symbol')
+        .agg(pl.col('timestamp').max())
+        .collect()
     )
+    return {symbol: pd.Timestamp(last_timestamp) for symbol, last_timestamp in hwm_df.iter_rows()}
+
+def save_high_water_marks(high_water_marks: Dict[str, pd.Timestamp]):
+    """Persist the per-symbol last timestamp index next to the Parquet store."""
+    os.makedirs('data', exist_ok=True)
+    with open(os.path.join('data', HWM_FILE), 'w', encoding='utf-8') as f:
+        json.dump({symbol: pd.Timestamp(ts).isoformat() for symbol, ts in high_water_marks.items()}, f)
+
+def load_high_water_marks() -> Dict[str, pd.Timestamp]:
+    """Load the per-symbol last timestamp index, rebuilding it if missing or older than the store."""
+    hwm_path = os.path.join('data', HWM_FILE)
+    if not pipeline.bar_store.exists():
+        return {}
+    if os.path.exists(hwm_path) and os.path.getmtime(hwm_path) >= pipeline.bar_store.last_modified():
+        with open(hwm_path, 'r', encoding='utf-8') as f:
+            return {symbol: pd.Timestamp(ts) for symbol, ts in json.load(f).items()}
+    logger.info(f"Rebuilding {HWM_FILE} from {STORE_DIR}")
+    high_water_marks = compute_high_water_marks()
+    save_high_water_marks(high_water_marks)
+    return high_water_marks
+
+def serialize_symbol_json(group: pl.DataFrame, layout: str = 'records') -> bytes:
+    """Serialize one symbol's bars straight to JSON bytes.
+
+    'records' is a list of row objects; 'columns' is one array per field plus the symbol, without repeated keys.
+    """
+    group = group.with_columns(pl.col('timestamp').dt.strftime('%Y-%m-%d').alias('date')).drop('timestamp')
+    if layout == 'columns':
+        columns = {'symbol': group['symbol'][0], **group.drop('symbol').to_dict(as_series=False)}
+        return json.dumps(columns, separators=(',', ':')).encode('utf-8')
+    return group.write_json().encode('utf-8')
+
+def serialize_symbol_arrow(group: pl.DataFrame) -> bytes:
+    """Serialize one symbol's bars to an uncompressed Arrow IPC file so readers can memory-map it zero-copy."""
+    buffer = io.BytesIO()
+    group.write_ipc(buffer, compression='uncompressed')
+    return buffer.getvalue()
+
+@timer('stock.export_symbol')
+def process_and_save_symbol(grouped_data: Tuple[str, pl.DataFrame]) -> Tuple[List[Future], int]:
+    """Serialize data for a single symbol once per layout and queue the bytes on the shared S3 uploader.
+
+    Returns the upload futures and the number of serialized bytes they hold until they finish.
+    """
+    symbol, group = grouped_data
+    uploader = get_uploader()
+    with timer('stock.serialize_json'):
+        body = serialize_symbol_json(group)
+    queued_bytes = len(body)
+    incr('serialized_bytes', len(body), format='json')
+    incr('rows', group.height, stage='exported')
+    if WRITE_LOCAL_JSON:
+        os.makedirs(JSON_DIR, exist_ok=True)
+        with open(os.path.join(JSON_DIR, f'{symbol}.json'), 'wb') as f:
+            f.write(body)
+    # Compression (JSON_CONTENT_ENCODING) happens on the upload workers
+    futures = [uploader.submit_bytes(S3_BUCKET, f'{S3_JSON_PREFIX}/{symbol}.json', body,
+                                     content_type='application/json', content_encoding=JSON_CONTENT_ENCODING)]
+    if EXPORT_COLUMNAR_JSON:
+        columnar_body = serialize_symbol_json(group, layout='columns')
+        queued_bytes += len(columnar_body)
+        futures.append(uploader.submit_bytes(S3_BUCKET, f'{S3_COLUMNAR_JSON_PREFIX}/{symbol}.json', columnar_body,
+                                             content_type='application/json', content_encoding=JSON_CONTENT_ENCODING))
+    if EXPORT_ARROW:
+        with timer('stock.serialize_arrow'):
+            arrow_body = serialize_symbol_arrow(group)
+        incr('serialized_bytes', len(arrow_body), format='arrow')
+        queued_bytes += len(arrow_body)
+        if WRITE_LOCAL_ARROW:
+            os.makedirs(ARROW_DIR, exist_ok=True)
+            with open(os.path.join(ARROW_DIR, f'{symbol}.arrow'), 'wb') as f:
+                f.write(arrow_body)
+        futures.append(uploader.submit_bytes(S3_BUCKET, f'{S3_ARROW_PREFIX}/{symbol}.arrow', arrow_body,
+                                             content_type='application/vnd.apache.arrow.file'))
     if PRINT_LOG:
-        logger.debug(f"Processed and saved data for {symbol}")
+        logger.debug(f"Processed and queued data for {symbol}")
+    return futures, queued_bytes
+
+def load_export_manifest() -> Dict[str, str]:
+    """Load the {symbol: version} manifest of the last successful JSON export."""
+    manifest_path = os.path.join('data', EXPORT_MANIFEST_FILE)
+    if FORCE_FULL_EXPORT or not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_export_manifest(manifest: Dict[str, str]):
+    os.makedirs('data', exist_ok=True)
+    with open(os.path.join('data', EXPORT_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+def export_formats() -> str:
+    """Enabled export layouts and the JSON Content-Encoding, e.g. 'json+arrow:identity'."""
+    formats = ['json'] + (['columnar'] if EXPORT_COLUMNAR_JSON else []) + (['arrow'] if EXPORT_ARROW else [])
+    return f"{'+'.join(formats)}:{JSON_CONTENT_ENCODING or 'identity'}"
+
+def compute_symbol_versions() -> Tuple[Dict[str, str], Dict[str, int]]:
+    """Version each symbol by its last timestamp, number of distinct bars, stored columns and export formats;
+    appends, backfills, new columns (e.g. the indicator backfill) and enabling another layout or encoding
+    change it, while duplicate delta rows and compaction (same bars, fewer files) do not.
+
+    Returns the versions and the bar count of each symbol.
+    """
+    versions = (
+        pipeline.bar_store.scan(dedupe=False)
+        .select(['symbol', 'timestamp'])
+        .group_by('symbol')
+        .agg(pl.col('timestamp').max(), pl.col('timestamp').n_unique().alias('rows'))
+        .collect()
+    )
+    columns = ','.join(pipeline.bar_store.common_columns())
+    formats = export_formats()
+    return (
+        {symbol: f"{last_timestamp.isoformat()}|{rows}|{columns}|{formats}"
+         for symbol, last_timestamp, rows in versions.iter_rows()},
+        dict(zip(versions['symbol'].to_list(), versions['rows'].to_list())),
+    )
+
+def next_export_chunk(symbols: List[str], rows_by_symbol: Dict[str, int], max_rows: int) -> List[str]:
+    """Leading symbols whose combined row count stays under max_rows (at least one)."""
+    chunk, chunk_rows = [], 0
+    for symbol in symbols:
+        rows = rows_by_symbol.get(symbol, 0)
+        if chunk and chunk_rows + rows > max_rows:
+            break
+        chunk.append(symbol)
+        chunk_rows += rows
+    return chunk
+
+@timer('stock.export')
+def export_json_files():
+    """Serialize and upload the per-ticker JSON of every symbol whose data changed since the last export.
+
+    Symbols are streamed from the store in chunks, so peak memory stays near EXPORT_MEMORY_LIMIT_MB above the
+    starting RSS rather than growing with the universe. Chunks are sized from the RSS a bar actually cost so far
+    (reading, deduplicating and splitting it); each symbol's bars are released once serialized, and serialized
+    bodies still waiting for upload are capped at EXPORT_UPLOAD_SHARE of the limit by waiting for the oldest
+    symbols' uploads. Whether the limit held is logged (and counted) at the end.
+    """
+    if not pipeline.bar_store.exists():
+        logger.info("No stored data to export.")
+        return
+
+    start_rss_mb, peak_before_mb = get_current_rss_mb(), get_peak_rss_mb()
+    manifest = load_export_manifest()
+    versions, rows_by_symbol = compute_symbol_versions()
+    dirty_symbols = [symbol for symbol, version in versions.items() if manifest.get(symbol) != version]
+    logger.info(f"Exporting {len(dirty_symbols)} changed symbols, skipped {len(versions) - len(dirty_symbols)} unchanged")
+    if not dirty_symbols:
+        return
+
+    limit_bytes = EXPORT_MEMORY_LIMIT_MB * 1024 * 1024
+    upload_budget = int(limit_bytes * EXPORT_UPLOAD_SHARE)
+    # Whatever the version scan already added (e.g. the Polars thread pool) comes out of the bars' share
+    overhead_bytes = max(0.0, get_current_rss_mb() - start_rss_mb) * 1024 * 1024
+    frame_budget = max(0, int(limit_bytes - upload_budget - overhead_bytes))
+    bytes_per_row = EXPORT_BYTES_PER_ROW
+    remaining = sorted(dirty_symbols)
+    pending = []  # (symbol, futures, queued bytes), oldest first
+    queued_bytes = 0
+    num_chunks = 0
+
+    def settle(symbol: str, symbol_futures: List[Future]):
+        """Wait for one symbol's uploads; only fully uploaded symbols are recorded in the manifest."""
+        try:
+            for future in symbol_futures:
+                future.result()
+            manifest[symbol] = versions[symbol]
+            incr('symbols_exported')
+        except Exception as e:
+            logger.error(f"Error exporting {symbol}: {e}")
+            incr('symbols_failed', stage='export')
+
+    while remaining:
+        chunk = next_export_chunk(remaining, rows_by_symbol, max(1, frame_budget // bytes_per_row))
+        remaining = remaining[len(chunk):]
+        num_chunks += 1
+        # Read only this chunk's symbols (row groups of other symbols are skipped) and split them
+        chunk_start_mb = get_current_rss_mb()
+        with timer('stock.export_read'):
+            chunk_df = load_data_from_parquet(symbols=chunk)
+        if chunk_df.is_empty():
+            continue
+        chunk_rows = chunk_df.height
+        groups = chunk_df.partition_by('symbol', as_dict=True)
+        del chunk_df
+        # Memory freed by earlier chunks (or the update) is kept by the allocator and reused, making later
+        # chunks look cheaper than they are, so the largest cost seen is kept
+        chunk_cost = (get_current_rss_mb() - chunk_start_mb) * 1024 * 1024 / chunk_rows
+        bytes_per_row = max(bytes_per_row, int(chunk_cost))
+        for (symbol,) in list(groups):
+            symbol_futures, symbol_bytes = process_and_save_symbol((symbol, groups.pop((symbol,))))
+            pending.append((symbol, symbol_futures, symbol_bytes))
+            queued_bytes += symbol_bytes
+            with timer('stock.upload_wait'):
+                while pending and queued_bytes > upload_budget:
+                    settled_symbol, settled_futures, settled_bytes = pending.pop(0)
+                    settle(settled_symbol, settled_futures)
+                    queued_bytes -= settled_bytes
+        del groups
+
+    with timer('stock.upload_wait'):
+        for symbol, symbol_futures, _ in pending:
+            settle(symbol, symbol_futures)
+    del pending
+
+    # Drop symbols that are no longer in the store
+    save_export_manifest({symbol: version for symbol, version in manifest.items() if symbol in versions})
+    peak_mb = get_peak_rss_mb()
+    # Attributable to the export only if it raised the process peak
+    export_peak_mb = peak_mb - start_rss_mb if peak_mb > peak_before_mb else 0.0
+    logger.info(f"Exported in {num_chunks} chunks, peak RSS {peak_mb:.0f} MB "
+                f"({export_peak_mb:.0f} MB above the start of the export, limit {EXPORT_MEMORY_LIMIT_MB} MB)")
+    if export_peak_mb > EXPORT_MEMORY_LIMIT_MB:
+        logger.warning(f"Export exceeded EXPORT_MEMORY_LIMIT_MB by {export_peak_mb - EXPORT_MEMORY_LIMIT_MB:.0f} MB")
+        incr('export_memory_limit_exceeded')
 
 def main():
     print('PROCESS STARTS AT : {}'.format(datetime.now()))
     logger.info('PROCESS STARTS')
+    metrics = start_run('stock')
     update_parquet_with_latest_data()  # Update the Parquet file with the latest data
+    export_json_files()  # Re-export only the symbols whose data changed
 
-    updated_df = load_data_from_parquet(os.path.join('data', PARQUET_FILE))
-
-    # Group the data by symbol
-    grouped = updated_df.groupby('symbol')
-
-    # Process and save data in parallel
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        executor.map(process_and_save_symbol, grouped)
-
+    logger.info(f"Run report written to {metrics.write_report()}")
     logger.info('PROCESS ENDS')
     print('PROCESS ENDS AT : {}'.format(datetime.now()))
 
@@ -0,0 +1,39 @@
+"""
+Execution engine for blocking API calls made from asyncio code.
+The Alpaca client is synchronous, so calls are offloaded to a thread pool to keep N requests in flight.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class FetchEngine:
+    """Run blocking fetch calls in a thread pool so up to `concurrency` of them overlap."""
+
+    def __init__(self, concurrency: int = 5, thread_name_prefix: str = 'fetch'):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.concurrency = concurrency
+        self.thread_name_prefix = thread_name_prefix
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Create the thread pool on first use."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                thread_name_prefix=self.thread_name_prefix)
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Await func(*args, **kwargs) executed on the pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        """Release the worker threads; the pool is recreated on next use."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,68 @@
+"""
+Technical-indicator columns for daily bars, computed for all symbols in one vectorized Polars pass.
+Stored with the bars, so consumers no longer recompute them. Incremental updates only need the tail of
+each symbol's stored history: the longest rolling window plus warm-up for the smoothed RSI, and the
+stored peak_close, which carries the all-time high needed for drawdown.
+"""
+
+from typing import Optional
+
+import polars as pl
+
+INDICATOR_COLUMNS = ['daily_return', 'peak_close', 'drawdown', 'rsi', 'sma_20', 'sma_50', 'sma_200', 'volatility_20']
+RSI_PERIOD = 14
+TAIL_BARS = 250  # sma_200 window plus warm-up for Wilder's RSI smoothing
+TAIL_CALENDAR_DAYS = 400  # Calendar span that covers TAIL_BARS trading days
+
+
+def compute_indicators(new_bars: pl.DataFrame, tail: Optional[pl.DataFrame] = None) -> pl.DataFrame:
+    """Return new_bars with INDICATOR_COLUMNS added.
+
+    tail holds already stored bars (with indicators) preceding new_bars; only its last TAIL_BARS rows per
+    symbol are used as context. Without a tail, new_bars are treated as each symbol's full history.
+    Returns and drawdown are in percent, matching the stock entry schema in app.py.
+    """
+    bar_columns = [column for column in new_bars.columns if column not in INDICATOR_COLUMNS]
+    new_bars = new_bars.select(bar_columns).with_columns(pl.lit(True).alias('_is_new'))
+
+    if tail is not None and not tail.is_empty():
+        context = (
+            tail.filter(pl.col('symbol').is_in(new_bars['symbol'].unique().implode()))
+            # A re-fetched bar replaces its stored copy in the context
+            .join(new_bars.select(['symbol', 'timestamp']), on=['symbol', 'timestamp'], how='anti')
+            .sort(['symbol', 'timestamp'])
+            .group_by('symbol', maintain_order=True)
+            .tail(TAIL_BARS)
+            .select(bar_columns + ['peak_close'])
+            .with_columns(pl.lit(False).alias('_is_new'))
+        )
+        new_bars = new_bars.with_columns(pl.col('timestamp').cast(context.schema['timestamp']))
+        frame = pl.concat([context, new_bars], how='diagonal_relaxed')
+    else:
+        frame = new_bars.with_columns(pl.lit(None, dtype=pl.Float64).alias('peak_close'))
+
+    close = pl.col('close')
+    delta = close.diff().over('symbol')
+    avg_gain = delta.clip(lower_bound=0).ewm_mean(alpha=1 / RSI_PERIOD, adjust=False, min_samples=RSI_PERIOD)
+    avg_loss = (-delta).clip(lower_bound=0).ewm_mean(alpha=1 / RSI_PERIOD, adjust=False, min_samples=RSI_PERIOD)
+    daily_return = (close / close.shift(1) - 1).over('symbol') * 100
+
+    frame = (
+        frame.sort(['symbol', 'timestamp'])
+        .with_columns(
+            daily_return.alias('daily_return'),
+            # Stored rows keep their peak (the all-time high so far); new rows extend it with their closes
+            pl.when(pl.col('_is_new')).then(close).otherwise(pl.col('peak_close'))
+            .cum_max().over('symbol').alias('peak_close'),
+            # A flat window (no gains or losses) gives 0/0; store null rather than NaN, which JSON cannot carry
+            (100 - 100 / (1 + avg_gain.over('symbol') / avg_loss.over('symbol'))).fill_nan(None).alias('rsi'),
+            close.rolling_mean(20).over('symbol').alias('sma_20'),
+            close.rolling_mean(50).over('symbol').alias('sma_50'),
+            close.rolling_mean(200).over('symbol').alias('sma_200'),
+        )
+        .with_columns(
+            ((close / pl.col('peak_close') - 1) * 100).alias('drawdown'),
+            pl.col('daily_return').rolling_std(20).over('symbol').alias('volatility_20'),
+        )
+    )
+    return frame.filter(pl.col('_is_new')).select(bar_columns + INDICATOR_COLUMNS)
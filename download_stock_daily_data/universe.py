@@ -0,0 +1,178 @@
+"""
+Resolve the stock symbol universe from index constituent pages (Wikipedia) with a shared cache.
+Each source is cached with its ETag/Last-Modified; after the TTL it is revalidated with a conditional GET,
+so an unchanged page costs one 304 instead of a download and an HTML parse. Every resolve is diffed against
+the previous universe, so added tickers can be backfilled and removed ones are no longer fetched.
+Offline mode reads the pages from a fixture directory (<fixture_dir>/<source>.html or .csv) for tests.
+"""
+
+import io
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = 'symbol_universe.json'
+TTL_SECONDS = 7 * 24 * 3600  # Revalidate a source once its cached copy is older than this
+REQUEST_TIMEOUT = 30
+USER_AGENT = 'data-downloader/1.0 (symbol universe)'
+
+# Each source: page URL, column holding the tickers, and the legacy CSV cache used to seed the first run
+INDEX_SOURCES = {
+    'sp500': {
+        'url': 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies',
+        'column': 'Symbol',
+        'csv_file': 'sp500_symbols.csv',
+    },
+    'nasdaq100': {
+        'url': 'https://en.wikipedia.org/wiki/NASDAQ-100',
+        'column': 'Ticker',
+        'csv_file': 'nasdaq100_symbols.csv',
+    },
+}
+
+
+def normalize_symbols(symbols) -> List[str]:
+    """Alpaca spells share classes with '-' (BRK-B), Wikipedia with '.' (BRK.B)."""
+    return [str(symbol).strip().replace('.', '-') for symbol in symbols if isinstance(symbol, str) and symbol.strip()]
+
+
+def parse_constituents(content: str, column: str) -> List[str]:
+    """Extract the ticker column from the first table that has it, instead of relying on the table's position."""
+    for table in pd.read_html(io.StringIO(content)):
+        if column in table.columns:
+            return normalize_symbols(table[column])
+    raise ValueError(f"No table with a '{column}' column")
+
+
+class UniverseDiff:
+    """Resolved symbols plus the tickers added and removed since the previous resolve."""
+
+    def __init__(self, symbols: List[str], added: List[str], removed: List[str]):
+        self.symbols = symbols
+        self.added = added
+        self.removed = removed
+
+    def __repr__(self):
+        return f"UniverseDiff({len(self.symbols)} symbols, +{len(self.added)}, -{len(self.removed)})"
+
+
+class UniverseResolver:
+    """Cached, revalidated index constituents combined with static symbol lists."""
+
+    def __init__(self, cache_file: str = CACHE_FILE, ttl_seconds: float = TTL_SECONDS,
+                 sources: Optional[Dict[str, dict]] = None, offline: Optional[bool] = None,
+                 fixture_dir: Optional[str] = None):
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.sources = sources or INDEX_SOURCES
+        # UNIVERSE_FIXTURE_DIR switches every resolver to offline fixtures, e.g. under tests
+        self.fixture_dir = fixture_dir or os.environ.get('UNIVERSE_FIXTURE_DIR')
+        self.offline = bool(self.fixture_dir) if offline is None else offline
+        self._cache = None
+
+    @property
+    def cache(self) -> dict:
+        if self._cache is None:
+            self._cache = {'sources': {}, 'universe': None}
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self._cache.update(json.load(f))
+        return self._cache
+
+    def save(self):
+        tmp_path = self.cache_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, indent=1)
+        os.replace(tmp_path, self.cache_file)
+
+    def _seed_from_csv(self, name: str) -> Optional[dict]:
+        """Start from the legacy CSV cache if there is no entry yet (treated as stale, so it is revalidated)."""
+        source = self.sources[name]
+        csv_file = source.get('csv_file')
+        if not csv_file or not os.path.exists(csv_file):
+            return None
+        symbols = normalize_symbols(pd.read_csv(csv_file)[source['column']])
+        return {'symbols': symbols, 'etag': None, 'last_modified': None, 'checked_at': 0}
+
+    def _read_fixture(self, name: str) -> List[str]:
+        column = self.sources[name]['column']
+        html_path = os.path.join(self.fixture_dir, f'{name}.html')
+        if os.path.exists(html_path):
+            with open(html_path, 'r', encoding='utf-8') as f:
+                return parse_constituents(f.read(), column)
+        return normalize_symbols(pd.read_csv(os.path.join(self.fixture_dir, f'{name}.csv'))[column])
+
+    def _revalidate(self, name: str, entry: Optional[dict]) -> dict:
+        """Conditional GET of a source page; a 304 keeps the cached symbols and only refreshes checked_at."""
+        source = self.sources[name]
+        headers = {'User-Agent': USER_AGENT}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        request = urllib.request.Request(source['url'], headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as resp:
+                content = resp.read().decode('utf-8')
+                etag, last_modified = resp.headers.get('ETag'), resp.headers.get('Last-Modified')
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry:
+                logger.info(f"{name} constituents not modified")
+                return dict(entry, checked_at=time.time())
+            raise
+        symbols = parse_constituents(content, source['column'])
+        logger.info(f"{name} constituents fetched: {len(symbols)} symbols")
+        return {'symbols': symbols, 'etag': etag, 'last_modified': last_modified, 'checked_at': time.time()}
+
+    def constituents(self, name: str) -> List[str]:
+        """Symbols of one index source: fixture when offline, cache within the TTL, otherwise revalidated."""
+        if self.offline:
+            return self._read_fixture(name)
+        entry = self.cache['sources'].get(name) or self._seed_from_csv(name)
+        if entry and time.time() - entry['checked_at'] < self.ttl_seconds:
+            return entry['symbols']
+        try:
+            entry = self._revalidate(name, entry)
+        except Exception as e:
+            if not entry:
+                logger.error(f"Error fetching {name} constituents and no cached copy: {e}")
+                return []
+            logger.error(f"Error fetching {name} constituents, using cached copy: {e}")
+            return entry['symbols']
+        self.cache['sources'][name] = entry
+        return entry['symbols']
+
+    def resolve(self, static_symbols: Optional[List[str]] = None) -> UniverseDiff:
+        """Combine all sources and static_symbols, diff against the previous universe and remember it.
+
+        The first resolve has nothing to diff against and reports no changes.
+        """
+        symbols = set(static_symbols or [])
+        complete = True
+        for name in self.sources:
+            source_symbols = self.constituents(name)
+            complete = complete and bool(source_symbols)
+            symbols.update(source_symbols)
+        symbols = sorted(symbols)
+        previous = self.cache.get('universe')
+        added, removed = [], []
+        if not complete:
+            # A source that could not be read would show up as all of its tickers removed, then re-added
+            logger.warning("Universe incomplete, not diffing or recording it")
+        else:
+            if previous is not None:
+                added = sorted(set(symbols) - set(previous))
+                removed = sorted(set(previous) - set(symbols))
+            if added or removed:
+                logger.info(f"Universe changed: added {added}, removed {removed}")
+            self.cache['universe'] = symbols
+        self.save()
+        return UniverseDiff(symbols, added, removed)
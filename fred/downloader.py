@@ -1,15 +1,34 @@
+import hashlib
 import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 # Assuming the Fred class is saved in a file called FredClass.py
 from TAI.source import Fred
 from TAI.data import DataMaster
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import incr, start_run, timer
+from common.rate_limiter import get_rate_limiter
+from common.chart_json import chart_frame, encode_chart_entries
+from common.downsample import SHORT_WINDOW, downsample_entries
+from common.s3_upload import JSON_CONTENT_ENCODING, get_uploader
+
+MAX_CONCURRENT_FETCHES = 6  # Series fetched at once; the shared FRED limiter still spaces the requests
+CACHE_DIR = 'fred_cache'
+CACHE_INDEX_FILE = 'fred_cache/index.json'  # Vintage of each series as of its last published JSON
+# Reduced views published next to each full file as api/fred_{name}/{name}_{series}.json: name -> (resolution, years)
+DERIVED_WINDOWS = {'short': SHORT_WINDOW}
+
 
 class FredToJson:
     def __init__(self):
         self.dm = DataMaster()
         self.client = Fred()
+        self.limiter = get_rate_limiter('fred')
+        self.uploader = get_uploader()
         # Combined mapping for chartType and description
         self.series_mapping = {
             'us_30yr_fix_mortgage_rate': {
@@ -62,18 +81,52 @@ class FredToJson:
             }
         }
 
-    def create_json_data(self, item):
-        data = self.client.get_latest_release(item)
-        json_data = []
+    @timer('fred.fetch')
+    def fetch_series(self, item):
+        data = self.limiter.call(self.client.get_latest_release, item)
+        incr('rows', len(data), stage='fetched')
+        return data
+
+    @staticmethod
+    def series_vintage(data):
+        """Latest observation date plus a hash of all observations, so revisions also count as a new vintage."""
+        digest = hashlib.sha1(pd.util.hash_pandas_object(data, index=True).values.tobytes()).hexdigest()[:12]
+        last_date = data.index.max().strftime('%Y-%m-%d') if len(data) else 'empty'
+        return f'{last_date}_{digest}'
+
+    def load_cache_index(self):
+        if os.path.exists(CACHE_INDEX_FILE):
+            with open(CACHE_INDEX_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def save_cache_index(self, index):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(CACHE_INDEX_FILE, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1)
 
-        for date, value in data.items():
-            # Replace NaN with None (which translates to null in JSON)
-            if pd.isna(value):
-                value = None
-            json_data.append({
-                "date": date.strftime('%Y-%m-%d'),  # Convert date to string
-                "value": value
-            })
+    def refresh_series(self, item, published_vintage=None):
+        """Fetch one series and publish it only if its vintage differs from the published one.
+
+        Returns the new vintage if it was published, None if unchanged. Raises if a publish upload failed,
+        so the series is retried on the next run.
+        """
+        data = self.fetch_series(item)
+        vintage = self.series_vintage(data)
+        if vintage == published_vintage:
+            return None
+        json_data = self.create_json_data(item, data)
+        filename = f"{item}.json"
+        for future in self.save_to_json(filename, json_data):
+            future.result()
+        print(f"{filename} saved successfully (full and short versions).")
+        return vintage
+
+    def create_json_data(self, item, data=None):
+        if data is None:
+            data = self.fetch_series(item)
+        # Bulk date formatting and NaN -> null for the whole series
+        json_data = chart_frame(data.index, data.values)
 
         # Get the appropriate chartType and description from series_mapping
         chart_type = self.series_mapping[item]['chartType']
@@ -90,46 +143,71 @@ class FredToJson:
 
         return json_structure
 
-    def filter_yearly_data(self, data):
-        current_year = datetime.now().year
-        five_years_ago = current_year - 4
-
-        yearly_data = []
-        for item in data:
-            chart_data = item['chartData']
-            yearly_points = {}
-            for point in chart_data:
-                year = int(point['date'][:4])
-                if year >= five_years_ago:
-                    yearly_points[year] = point
-
-            item['chartData'] = list(yearly_points.values())
-            yearly_data.append(item)
-        return yearly_data
+    def save_local_json(self, filename, body):
+        with open(os.path.join('data', filename), 'wb') as f:
+            f.write(body)
 
+    @timer('fred.serialize')
     def save_to_json(self, filename, data):
         # Save full dataset
-        self.dm.save_local(data, 'data', filename, delete_local=False)
-        self.dm.save_s3(data, 'jtrade1-dir', 'api/fred',
-                        filename, use_polars=False, delete_local=True)
+        body = encode_chart_entries(data)
+        incr('serialized_bytes', len(body))
+        self.save_local_json(filename, body)
+        futures = [self.uploader.submit_bytes('jtrade1-dir', f'api/fred/{filename}', body,
+                                              content_encoding=JSON_CONTENT_ENCODING)]
 
-        # Create and save short dataset
-        json_short = self.filter_yearly_data(data)
-        short_filename = f"short_{filename}"
-        self.dm.save_local(json_short, 'data',
-                           short_filename, delete_local=False)
-        self.dm.save_s3(json_short, 'jtrade1-dir', 'api/fred_short',
-                        short_filename, use_polars=False, delete_local=True)
+        # Create and save the derived datasets (e.g. short_{filename}) in the same pass
+        for name, derived in downsample_entries(data, DERIVED_WINDOWS).items():
+            derived_body = encode_chart_entries(derived)
+            incr('serialized_bytes', len(derived_body))
+            derived_filename = f"{name}_{filename}"
+            self.save_local_json(derived_filename, derived_body)
+            futures.append(self.uploader.submit_bytes('jtrade1-dir', f'api/fred_{name}/{derived_filename}',
+                                                      derived_body, content_encoding=JSON_CONTENT_ENCODING))
+        return futures
 
 
-if __name__ == "__main__":
-    print('PROCESS STARTS AT : {}'.format(datetime.now()))
+def run():
+    """Refresh every series; raises at the end if any series or upload failed, after the rest are done."""
     fred_to_json = FredToJson()
     fred_to_json.dm.create_dir()
-    # Loop over all the series in the series_mapping
-    for series in fred_to_json.series_mapping.keys():
-        json_data = fred_to_json.create_json_data(series)
-        filename = f"{series}.json"
-        fred_to_json.save_to_json(filename, json_data)
-        print(f"{filename} saved successfully (full and short versions).")
+    index = fred_to_json.load_cache_index()
+    # Fetch all series concurrently; only series with a new vintage are re-serialized and uploaded
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES, thread_name_prefix='fred-fetch') as executor:
+        futures = {series: executor.submit(fred_to_json.refresh_series, series, index.get(series))
+                   for series in fred_to_json.series_mapping.keys()}
+    unchanged, failed = [], []
+    for series, future in futures.items():
+        try:
+            vintage = future.result()
+        except Exception as e:
+            print(f"{series} failed: {e}")
+            failed.append(series)
+            continue
+        if vintage is None:
+            unchanged.append(series)
+        else:
+            index[series] = vintage
+    fred_to_json.save_cache_index(index)
+    incr('series', len(unchanged), status='unchanged')
+    incr('series', len(failed), status='failed')
+    incr('series', len(futures) - len(unchanged) - len(failed), status='published')
+    print(f"{len(futures) - len(unchanged) - len(failed)} series published, {len(unchanged)} unchanged, "
+          f"{len(failed)} failed.")
+    # Uploads run concurrently in the background; wait for them before exiting
+    with timer('fred.upload_wait'):
+        failed_uploads = fred_to_json.uploader.wait()
+    if failed_uploads:
+        print(f"{failed_uploads} uploads failed.")
+    if failed or failed_uploads:
+        raise RuntimeError(f"FRED refresh incomplete: {len(failed)} series and {failed_uploads} uploads failed")
+
+
+if __name__ == "__main__":
+    print('PROCESS STARTS AT : {}'.format(datetime.now()))
+    metrics = start_run('fred')
+    try:
+        run()
+    finally:
+        print(f"Run report: {metrics.write_report()}")
     print('PROCESS ENDS AT : {}'.format(datetime.now()))
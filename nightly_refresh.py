@@ -0,0 +1,71 @@
+#!/usr/bin/env python3.10
+"""
+Nightly refresh of every source (stock daily bars, FRED, BLS, US Treasury curve) as one DAG of jobs.
+Independent sources run concurrently in worker processes, so the whole refresh takes about as long as the
+slowest source; within a source, jobs wait for what they depend on (e.g. bls_data.json is aggregated only
+after every BLS series is published). Prints per-job wall time at the end; every job, and the night as a
+whole, leaves a run report (JSON and Prometheus text) in run_reports/.
+Usage: python nightly_refresh.py [--sources stock fred bls treasury] [--max-workers N]
+"""
+
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+from common.metrics import start_run
+from common.orchestrator import Job, format_report, run_dag
+
+SOURCES = ['stock', 'fred', 'bls', 'treasury']
+# Same series as data_files in bls/downloader.py; one publish job each
+BLS_SERIES = ['unemployment_rate', 'nonfarm_payroll', 'us_avg_weekly_hours', 'us_job_opening']
+
+
+def build_jobs(sources: List[str]) -> List[Job]:
+    jobs = []
+    if 'stock' in sources:
+        script = 'download_stock_daily_data/daily_bar_downloader.py'
+        jobs += [
+            Job('stock.update', script, 'update_parquet_with_latest_data'),
+            Job('stock.export', script, 'export_json_files', deps=['stock.update']),
+        ]
+    if 'fred' in sources:
+        jobs.append(Job('fred', 'fred/downloader.py', 'run'))
+    if 'bls' in sources:
+        script = 'bls/downloader.py'
+        jobs.append(Job('bls.fetch', script, 'fetch_series'))
+        jobs += [Job(f'bls.{series}', script, 'publish_series', args=[series], deps=['bls.fetch'])
+                 for series in BLS_SERIES]
+        jobs.append(Job('bls.aggregate', script, 'aggregate', deps=[f'bls.{series}' for series in BLS_SERIES]))
+    if 'treasury' in sources:
+        jobs.append(Job('treasury', 'us_treasury_curve/downloader.py', 'run'))
+        jobs.append(Job('treasury.render', 'us_treasury_curve/chart_cache.py', 'render_yield_curve', deps=['treasury']))
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sources', nargs='+', choices=SOURCES, default=SOURCES)
+    parser.add_argument('--max-workers', type=int, help='Worker processes (default: one per job)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+
+    print('PROCESS STARTS AT : {}'.format(datetime.now()))
+    start = time.time()
+    metrics = start_run('nightly')
+    results = run_dag(build_jobs(args.sources), max_workers=args.max_workers)
+    for result in results.values():
+        metrics.incr('jobs', status=result.status)
+        if result.status == 'ok':
+            metrics.observe(f'job.{result.name}', result.seconds)
+    print(format_report(results, time.time() - start))
+    print(f"Run report: {metrics.write_report()}")
+    print('PROCESS ENDS AT : {}'.format(datetime.now()))
+    if any(result.status != 'ok' for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3.10
+"""
+Benchmark per-request latency of the yield-curve snapshot lookup behind generate_interest_rate_plot:
+the legacy path (read_csv + per-column fill + sort + nine index.asof lookups on every call) vs.
+CurveSnapshotService (cold load, then cached calls). Plotting itself is excluded.
+Usage: python bench_curve_snapshot.py --years 35 --calls 200
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from curve_snapshot import TENORS, TIME_PERIODS, CurveSnapshotService
+
+
+def make_rates_csv(path: str, years: int):
+    """Synthetic daily Treasury file (newest first, like treasury.gov), with the short tenors missing early on."""
+    dates = pd.bdate_range(end='2024-06-28', periods=years * 252)[::-1]
+    rng = np.random.default_rng(0)
+    rates = pd.DataFrame(rng.uniform(0, 6, (len(dates), len(TENORS))).round(2), columns=TENORS)
+    rates.insert(0, 'Date', dates.strftime('%m/%d/%Y'))
+    for tenor, since in (('1 Mo', '2001-07-31'), ('2 Mo', '2018-10-16'), ('4 Mo', '2022-10-18'), ('20 Yr', '1993-10-01')):
+        rates.loc[dates < since, tenor] = np.nan
+    rates.to_csv(path, index=False)
+
+
+def legacy_snapshots(full_path: str):
+    rates = pd.read_csv(full_path)
+    for col in rates.columns:
+        rates[col] = rates[col].fillna(rates[rates.columns[rates.columns.get_loc(col) - 1]])
+    rates['date'] = pd.to_datetime(rates['Date'])
+    rates = rates.sort_values(by='date', ascending=True)
+    rates = rates[['date'] + TENORS]
+    rates.set_index('date', inplace=True)
+    latest_rate_date = rates.index[-1]
+    rates_data = {'Today': rates.tail(1)}
+    for period_name, offset in TIME_PERIODS.items():
+        rates_data[period_name] = rates.loc[[rates.index.asof(latest_rate_date - offset)]]
+    return rates_data
+
+
+def latencies_ms(func, calls: int):
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings):
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:>22} {statistics.median(timings):>10.3f} {p99:>10.3f} {len(timings):>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=35)
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'treasury_yield_all.csv')
+        make_rates_csv(path, args.years)
+        print(f"{args.years} years of daily curves ({args.years * 252:,} rows)")
+        print(f"{'path':>22} {'p50 (ms)':>10} {'p99 (ms)':>10} {'calls':>6}")
+
+        report('legacy per request', latencies_ms(lambda: legacy_snapshots(path), max(args.calls // 10, 5)))
+
+        service = CurveSnapshotService(path)
+        report('service cold load', latencies_ms(lambda: CurveSnapshotService(path).snapshots(), 5))
+        service.snapshots()
+        report('service cached', latencies_ms(service.snapshots, args.calls))
+        offsets = pd.DatetimeIndex(pd.Timestamp('2024-06-28') - pd.to_timedelta(np.arange(0, 3650, 7), 'D'))
+        report(f'curves_at x{len(offsets)}', latencies_ms(lambda: service.curves_at(offsets), args.calls))
+
+        # Same curves as the legacy path for every tenor whose history is complete
+        legacy = legacy_snapshots(path)
+        for name, frame in service.snapshots().items():
+            assert frame.index[0] == legacy[name].index[0], name
+            assert np.allclose(frame[['10 Yr', '30 Yr']].to_numpy(), legacy[name][['10 Yr', '30 Yr']].to_numpy())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Pre-rendered yield-curve chart: after the Treasury refresh the figure is rendered once (figure JSON, and the
+index.html page with the plot embedded) and stored under data/rendered, keyed by a version hash of the rates
+file and the template. Page requests then read the cached bytes and answer If-None-Match with 304.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import timer
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+RENDER_DIR = os.path.join(CURRENT_DIR, 'data', 'rendered')
+MANIFEST_FILE = 'yield_curve.json'  # Current version and its rendered files
+TEMPLATE_DIR = os.path.join(CURRENT_DIR, 'templates')
+TEMPLATE_FILE = 'index.html'
+CONTENT_TYPES = {'page': 'text/html; charset=utf-8', 'figure': 'application/json'}
+CACHE_CONTROL = 'public, max-age=300'
+
+
+def data_version(rates_path: str) -> str:
+    """Hash of the rates file and the page template; any change to either gives a new version."""
+    digest = hashlib.sha1()
+    for path in (rates_path, os.path.join(TEMPLATE_DIR, TEMPLATE_FILE)):
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def load_manifest(render_dir: str = RENDER_DIR) -> Optional[dict]:
+    path = os.path.join(render_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_atomic(path: str, body: bytes):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(body)
+    os.replace(path + '.tmp', path)
+
+
+@timer('treasury.render')
+def render_yield_curve(render_dir: str = RENDER_DIR, force: bool = False) -> str:
+    """Render the figure and page for the current rates file unless that version is already cached.
+
+    Returns the version.
+    """
+    from jinja2 import Environment, FileSystemLoader
+    from plotter import generate_interest_rate_plot, get_rates_path
+
+    version = data_version(get_rates_path())
+    manifest = load_manifest(render_dir)
+    if manifest and manifest['version'] == version and not force:
+        print(f"Yield curve chart {version} already rendered.")
+        return version
+
+    fig = generate_interest_rate_plot()
+    fragment = fig.to_html(full_html=False, include_plotlyjs='cdn')
+    page = Environment(loader=FileSystemLoader(TEMPLATE_DIR)).get_template(TEMPLATE_FILE).render(plot=fragment)
+
+    os.makedirs(render_dir, exist_ok=True)
+    files = {'figure': f'yield_curve-{version}.json', 'page': f'yield_curve-{version}.html'}
+    _write_atomic(os.path.join(render_dir, files['figure']), fig.to_json().encode('utf-8'))
+    _write_atomic(os.path.join(render_dir, files['page']), page.encode('utf-8'))
+    # The manifest switches readers to the new version only once both files are complete
+    manifest = {'version': version, 'files': files, 'rendered_at': datetime.now().isoformat()}
+    _write_atomic(os.path.join(render_dir, MANIFEST_FILE), json.dumps(manifest).encode('utf-8'))
+    for name in os.listdir(render_dir):
+        if name.startswith('yield_curve-') and name not in files.values():
+            os.remove(os.path.join(render_dir, name))
+    print(f"Yield curve chart {version} rendered.")
+    return version
+
+
+class RenderedChart:
+    """Serves the cached renders; the files are re-read only when the manifest changes."""
+
+    def __init__(self, render_dir: str = RENDER_DIR):
+        self.render_dir = render_dir
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[float, str, bytes]] = {}  # kind -> (manifest mtime, etag, body)
+
+    def get(self, kind: str = 'page') -> Tuple[str, bytes]:
+        """(ETag, body) of the current render of kind ('page' or 'figure')."""
+        mtime = os.path.getmtime(os.path.join(self.render_dir, MANIFEST_FILE))
+        cached = self._cache.get(kind)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        with self._lock:
+            manifest = load_manifest(self.render_dir)
+            with open(os.path.join(self.render_dir, manifest['files'][kind]), 'rb') as f:
+                body = f.read()
+            etag = f'"{manifest["version"]}"'
+            self._cache[kind] = (mtime, etag, body)
+            return etag, body
+
+    def respond(self, kind: str = 'page', if_none_match: Optional[str] = None) -> Tuple[bytes, int, Dict[str, str]]:
+        """Flask-style (body, status, headers): 304 with no body when the client already has this version."""
+        etag, body = self.get(kind)
+        headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL, 'Content-Type': CONTENT_TYPES[kind]}
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return b'', 304, headers
+        return body, 200, headers
@@ -0,0 +1,107 @@
+"""
+In-memory yield-curve snapshots for the plotter: the rates file is parsed, sorted and gap-filled once into a
+(dates x tenors) matrix, reloaded only when the file's mtime changes, and curves "as of" any set of dates are
+found with a single vectorized searchsorted instead of one index.asof lookup per date.
+"""
+
+import os
+import threading
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+TENORS = ['1 Mo', '2 Mo', '3 Mo', '4 Mo', '6 Mo', '1 Yr', '2 Yr', '3 Yr', '5 Yr', '7 Yr', '10 Yr', '20 Yr', '30 Yr']
+
+# Snapshots shown on the chart besides 'Today'
+TIME_PERIODS = {
+    'Last Week': pd.DateOffset(weeks=1),
+    'Last Month': pd.DateOffset(months=1),
+    'Last 3 Months': pd.DateOffset(months=3),
+    'Last Year': pd.DateOffset(years=1),
+    '3 Years Ago': pd.DateOffset(years=3),
+    '5 Years Ago': pd.DateOffset(years=5),
+    '10 Years Ago': pd.DateOffset(years=10),
+    '20 Years Ago': pd.DateOffset(years=20),
+    '30 Years Ago': pd.DateOffset(years=30)
+}
+
+
+def load_rates(path: str) -> pd.DataFrame:
+    """Read a rates file (parquet or CSV with a 'Date' column) into a date-sorted, tenor-filled frame."""
+    rates = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    rates['date'] = pd.to_datetime(rates['Date'])
+    tenors = [tenor for tenor in TENORS if tenor in rates.columns]
+    rates = rates.sort_values(by='date', kind='stable').set_index('date')[tenors]
+    rates = rates.apply(pd.to_numeric, errors='coerce')
+    # A missing tenor takes the rate of the next shorter tenor on the same day, as one row-wise fill
+    return rates.ffill(axis=1)
+
+
+class CurveSnapshotService:
+    """Curve matrix of one rates file, cached in memory and invalidated on the file's mtime."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # (mtime, dates, values, tenors), replaced as a whole so readers never see a half-reloaded matrix
+        self._state = None
+
+    def _matrix(self):
+        mtime = os.path.getmtime(self.path)
+        state = self._state
+        if state is None or state[0] != mtime:
+            with self._lock:
+                state = self._state
+                if state is None or state[0] != mtime:
+                    rates = load_rates(self.path)
+                    state = (mtime, rates.index.values.astype('datetime64[ns]'), rates.to_numpy(), list(rates.columns))
+                    self._state = state
+        return state[1:]
+
+    @staticmethod
+    def _rows(dates, values, tenors, positions) -> pd.DataFrame:
+        return pd.DataFrame(values[positions], index=pd.DatetimeIndex(dates[positions], name='date'), columns=tenors)
+
+    @property
+    def latest_date(self) -> pd.Timestamp:
+        return pd.Timestamp(self._matrix()[0][-1])
+
+    def curves_at(self, dates: Iterable) -> pd.DataFrame:
+        """Curve as of each date (last row on or before it), indexed by the matched row dates.
+
+        Dates before the first row are dropped.
+        """
+        row_dates, values, tenors = self._matrix()
+        targets = pd.DatetimeIndex(dates).values.astype('datetime64[ns]')
+        positions = np.searchsorted(row_dates, targets, side='right') - 1
+        return self._rows(row_dates, values, tenors, positions[positions >= 0])
+
+    def curve_at(self, date) -> Optional[pd.Series]:
+        curves = self.curves_at([pd.Timestamp(date)])
+        return curves.iloc[0] if len(curves) else None
+
+    def snapshots(self, offsets: Dict[str, pd.DateOffset] = TIME_PERIODS) -> Dict[str, pd.DataFrame]:
+        """{'Today': latest curve, name: curve as of latest date - offset, ...}, each a one-row frame.
+
+        Periods reaching before the first row are left out.
+        """
+        row_dates, values, tenors = self._matrix()
+        latest = pd.Timestamp(row_dates[-1])
+        names = ['Today'] + list(offsets)
+        targets = np.array([latest] + [latest - offset for offset in offsets.values()], dtype='datetime64[ns]')
+        positions = np.searchsorted(row_dates, targets, side='right') - 1
+        return {name: self._rows(row_dates, values, tenors, [position])
+                for name, position in zip(names, positions) if position >= 0}
+
+
+_services: Dict[str, CurveSnapshotService] = {}
+_services_lock = threading.Lock()
+
+
+def get_snapshot_service(path: str) -> CurveSnapshotService:
+    """Process-wide service per rates file, so every request shares one parsed matrix."""
+    with _services_lock:
+        if path not in _services:
+            _services[path] = CurveSnapshotService(path)
+        return _services[path]
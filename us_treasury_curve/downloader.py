@@ -1,14 +1,25 @@
 from TAI.source import Treasury
 from TAI.data import DataMaster
 from datetime import datetime
+import hashlib
+import json
 import os
+import sys
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import incr, start_run, timer
+from common.rate_limiter import get_rate_limiter
+from common.s3_upload import JSON_CONTENT_ENCODING, get_uploader
+from chart_cache import render_yield_curve
 #
-print('PROCESS STARTS AT : {}'.format(datetime.now()))
 today = datetime.now()
 cur_year = today.year
 
 tr = Treasury()
 dm = DataMaster()
+limiter = get_rate_limiter('treasury')
+uploader = get_uploader()
 
 base_file = 'treasury_yield_all.parquet'
 
@@ -17,30 +28,119 @@ data_dir_path = os.path.join(current_dir, 'data')
 file_path = os.path.join(data_dir_path, base_file)  # .format(year))
 json_file_path = os.path.join(
     data_dir_path, 'treasury_yield_all.json')  # .format(year))
+# Small object published next to the full snapshot: latest curve plus the rows added or revised this run
+latest_key = 'api/treasury_yield_latest.json'
+# Version (content hash of the local parquet) and as-of date of the last fully uploaded snapshot
+published_file = os.path.join(data_dir_path, 'treasury_published.json')
+
 
+def fetch_years(start_year, end_year):
+    """Treasury.gov serves one file per year; each year is requested under its own limiter token."""
+    frames = [limiter.call(tr.get_treasury_historical, start_year=year, end_year=year)
+              for year in range(start_year, end_year + 1)]
+    return pd.concat(frames, ignore_index=True)
 
-def run_historical_data():  # Only need to run the first time
-    historical_rates = tr.get_treasury_historical(start_year=1990,
-                                                  end_year=2023)
+
+def run_historical_data():  # Only runs when the base file is missing
+    historical_rates = fetch_years(1990, cur_year - 1)
     dm.create_dir()
     dm.save_local(historical_rates, 'data', base_file, delete_local=False)
 
 
-def daily_refresh():  # update the latest data to the same csv file
-    udpated_df = tr.update_yearly_yield(cur_year, base_data_file=base_file)
+def upsert_rows(base_df, new_df):
+    """Replace stored rows by date with the fetched ones and append new dates.
+
+    Returns the merged frame and the fetched rows that are new or differ from what was stored.
+    """
+    base_df = base_df.assign(Date=pd.to_datetime(base_df['Date']))
+    new_df = new_df.assign(Date=pd.to_datetime(new_df['Date']))
+    merged = pd.concat([base_df[~base_df['Date'].isin(new_df['Date'])], new_df], ignore_index=True)
+    merged = merged.sort_values('Date').reset_index(drop=True)
+
+    joined = new_df.merge(base_df, on='Date', how='left', suffixes=('', '_stored'), indicator=True)
+    changed = joined['_merge'] == 'left_only'
+    for col in new_df.columns:
+        if col != 'Date' and col in base_df.columns:
+            same = (joined[col] == joined[f'{col}_stored']) | (joined[col].isna() & joined[f'{col}_stored'].isna())
+            changed |= ~same
+    return merged, new_df[changed.to_numpy()].sort_values('Date')
+
+
+def file_version(path):
+    """Content hash of a local file."""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
 
-    # Save the updated parquet to both local and S3
-    dm.save_local(udpated_df, 'data', base_file, delete_local=False)
-    dm.save_s3(udpated_df,  'jtrade1-dir', 'data/us_treasury_yield',
-               base_file, use_polars=False, delete_local=True)
-    print('{} Data successfully updated and written to file.'.format(datetime.today()))
+def load_published():
+    """Version and as-of date of the last snapshot whose uploads all succeeded ({} before the first)."""
+    if not os.path.exists(published_file):
+        return {}
+    with open(published_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
-    # Save the updated JSON File to both local and S3
-    df_dict = udpated_df.to_dict(orient='records')
-    dm.save_local(df_dict, 'data', 'treasury_yield_all.json',
-                  delete_local=False)
-    dm.save_s3(df_dict,  'jtrade1-dir', 'api',
-               'treasury_yield_all.json', use_polars=False, delete_local=True)
+
+def publish(updated_df, delta_df, previous_as_of):
+    """Upload the parquet, the full JSON (same bytes as the local copy) and the latest/delta object.
+
+    The published version is recorded only once every upload succeeded, so a failed run is re-published next time;
+    failed uploads raise.
+    """
+    # Upload the local parquet directly (multipart once it outgrows the threshold)
+    uploader.submit_file(file_path, 'jtrade1-dir', f'data/us_treasury_yield/{base_file}')
+
+    # Serialize the full history once for both the local and the S3 JSON
+    with timer('treasury.serialize'):
+        body = updated_df.to_json(orient='records', date_format='iso').encode('utf-8')
+    incr('serialized_bytes', len(body))
+    with open(json_file_path, 'wb') as f:
+        f.write(body)
+    uploader.submit_bytes('jtrade1-dir', 'api/treasury_yield_all.json', body,
+                          content_encoding=JSON_CONTENT_ENCODING)
+
+    # Latest curve and this run's delta, for clients that already hold the full snapshot
+    latest = {
+        'as_of': updated_df['Date'].max().isoformat(),
+        'previous_as_of': previous_as_of.isoformat(),
+        'latest': json.loads(updated_df.tail(1).to_json(orient='records', date_format='iso'))[0],
+        'delta': json.loads(delta_df.to_json(orient='records', date_format='iso')),
+    }
+    uploader.submit_json('jtrade1-dir', latest_key, latest)
+    with timer('treasury.upload_wait'):
+        failed_uploads = uploader.wait()
+    if failed_uploads:
+        raise RuntimeError(f"{failed_uploads} Treasury uploads failed")
+    with open(published_file, 'w', encoding='utf-8') as f:
+        json.dump({'version': file_version(file_path), 'as_of': latest['as_of']}, f)
+
+
+@timer('treasury.daily_refresh')
+def daily_refresh():  # upsert the latest data into the same parquet file
+    base_df = pd.read_parquet(file_path)
+    last_date = pd.to_datetime(base_df['Date']).max()
+    # Only the year(s) since the last stored date, normally just the current year
+    with timer('treasury.fetch'):
+        new_df = fetch_years(min(last_date.year, cur_year), cur_year)
+    incr('rows', len(new_df), stage='fetched')
+    with timer('treasury.merge'):
+        udpated_df, delta_df = upsert_rows(base_df, new_df)
+    incr('rows', len(delta_df), stage='changed')
+
+    published = load_published()
+    if not delta_df.empty:
+        # Save the updated parquet locally, then publish it
+        dm.save_local(udpated_df, 'data', base_file, delete_local=False)
+        print('{} Data successfully updated and written to file ({} new or revised rows).'.format(
+            datetime.today(), len(delta_df)))
+        publish(udpated_df, delta_df, last_date)
+    elif published.get('version') != file_version(file_path):
+        # Nothing new, but the last publish did not complete (or predates the record): upload the local file again
+        previous_as_of = pd.Timestamp(published['as_of']) if 'as_of' in published else last_date
+        print('{} Re-publishing Treasury yields as of {} (last upload incomplete).'.format(
+            datetime.today(), last_date.date()))
+        publish(udpated_df, udpated_df[udpated_df['Date'] > previous_as_of], previous_as_of)
+    else:
+        print('{} No new Treasury yields since {}.'.format(datetime.today(), last_date.date()))
 
 
 def print_local():
@@ -52,8 +152,19 @@ def print_local():
     print(df)
 
 
-run_historical_data()
-daily_refresh()
-print_local()
+def run():
+    if not os.path.exists(file_path):
+        run_historical_data()
+    daily_refresh()
+
 
-print('PROCESS ENDS AT : {}'.format(datetime.now()))
+if __name__ == "__main__":
+    print('PROCESS STARTS AT : {}'.format(datetime.now()))
+    metrics = start_run('treasury')
+    try:
+        run()
+        render_yield_curve()
+        print_local()
+    finally:
+        print(f"Run report: {metrics.write_report()}")
+    print('PROCESS ENDS AT : {}'.format(datetime.now()))